@@ -1,13 +1,21 @@
 from django.contrib import admin
-from .models import Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido, Estancia
+from .models import Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido, Estancia, Promocion, VentaDiaria, HistorialEstadoPedido, Tarea, ReservaStock, CambioCatalogo, ProductoRelacionado, ClaveIdempotencia
 
 admin.site.register(Usuario)
 admin.site.register(Categoria)
 admin.site.register(Producto)
 admin.site.register(Servicio)
 admin.site.register(Estancia)
+admin.site.register(Promocion)
 admin.site.register(Wishlist)
 admin.site.register(Carrito)
 admin.site.register(ItemCarrito)
+admin.site.register(ReservaStock)
 admin.site.register(Pedido)
 admin.site.register(DetallePedido)
+admin.site.register(HistorialEstadoPedido)
+admin.site.register(VentaDiaria)
+admin.site.register(Tarea)
+admin.site.register(CambioCatalogo)
+admin.site.register(ProductoRelacionado)
+admin.site.register(ClaveIdempotencia)
@@ -0,0 +1,71 @@
+"""
+Registro, login y edición de perfil con el mínimo de consultas: una inserción al registrar
+(la unicidad del email la garantiza la base de datos), una lectura de columnas concretas al
+hacer login y un UPDATE solo de los campos editados.
+"""
+from operator import attrgetter
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Usuario
+
+# Lo mismo que devuelve UsuarioSerializer, sin pasar por sus campos en cada respuesta
+CAMPOS_USUARIO = ('id', 'nombre', 'apellido', 'email', 'direccion', 'telefono', 'fecha_creacion', 'is_active')
+_valores_usuario = attrgetter(*CAMPOS_USUARIO)
+_fecha = serializers.DateTimeField()
+
+
+class EmailEnUso(Exception):
+    pass
+
+
+class UsuarioJWTAuthentication(JWTAuthentication):
+    """Los tokens se emiten para Usuario (respuesta_tokens), no para auth.User: se resuelven contra Usuario."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_model = Usuario
+
+
+def representar_usuario(usuario):
+    datos = dict(zip(CAMPOS_USUARIO, _valores_usuario(usuario)))
+    datos['fecha_creacion'] = _fecha.to_representation(datos['fecha_creacion'])
+    return datos
+
+
+def respuesta_tokens(usuario):
+    refresh = RefreshToken.for_user(usuario)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'usuario': representar_usuario(usuario),
+    }
+
+
+def registrar(datos):
+    """Crea el usuario con un único INSERT; la contraseña ya llega hasheada del serializer."""
+    usuario = Usuario(**datos)
+    try:
+        with transaction.atomic():
+            usuario.save(force_insert=True)
+    except IntegrityError:
+        raise EmailEnUso(datos.get('email'))
+    return usuario
+
+
+def autenticar(email, contraseña):
+    """Devuelve el usuario si las credenciales son correctas, o None."""
+    usuario = Usuario.objects.only(*CAMPOS_USUARIO, 'contraseña').filter(email=email).first()
+    if usuario is None or not usuario.check_password(contraseña):
+        return None
+    return usuario
+
+
+def actualizar(usuario, datos):
+    """Guarda solo los campos recibidos."""
+    for campo, valor in datos.items():
+        setattr(usuario, campo, valor)
+    if datos:
+        usuario.save(update_fields=list(datos))
+    return usuario
@@ -0,0 +1,33 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+CLAVE_INVALIDADO = 'catalogo:invalidado'
+
+
+def version_catalogo():
+    """Devuelve la versión actual del catálogo, usada para construir claves de caché."""
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, 1, timeout=None)
+        version = cache.get(CLAVE_VERSION_CATALOGO, 1)
+    return version
+
+
+def invalidar_catalogo():
+    """Invalida las respuestas cacheadas del catálogo incrementando su versión."""
+    cache.set(CLAVE_INVALIDADO, time.time(), timeout=None)
+    try:
+        cache.incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        cache.add(CLAVE_VERSION_CATALOGO, 2, timeout=None)
+
+
+def replicas_al_dia():
+    """
+    Si pasaron REPLICA_RETRASO_MAXIMO segundos desde la última invalidación, una réplica ya
+    tiene los cambios que la provocaron y lo que se lea de ella vale para la versión actual.
+    """
+    invalidado = cache.get(CLAVE_INVALIDADO)
+    return invalidado is None or time.time() - invalidado >= settings.REPLICA_RETRASO_MAXIMO
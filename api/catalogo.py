@@ -0,0 +1,140 @@
+import json
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from .compresion import comprimir
+from .models import Producto, CambioCatalogo, Categoria, Estancia
+
+COLUMNAS = ('id', 'nombre', 'descripcion', 'precio', 'descuento', 'precio_con_descuento',
+            'categoria', 'estancia', 'imagen', 'colores', 'materiales', 'peso')
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+# Clave del cerrojo de PostgreSQL que ordena las versiones por commit
+CERROJO_VERSIONES = 0x636c5f766572
+
+
+def version_actual():
+    return CambioCatalogo.objects.aggregate(version=Max('pk'))['version'] or 0
+
+
+def _insertar_cambios(cambios):
+    """
+    Las versiones son ids autoincrementales y un cliente que sincroniza hasta la versión N no
+    vuelve a pedir las anteriores, así que ninguna versión menor puede hacerse visible después
+    de una mayor. En PostgreSQL los ids de la secuencia se reparten sin esperar al commit: se
+    toma un cerrojo de transacción antes de insertar, de modo que quien obtiene un id confirma
+    antes de que otro pueda obtener el siguiente. En SQLite las escrituras ya van en serie
+    (BEGIN IMMEDIATE).
+    """
+    if not cambios:
+        return
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CERROJO_VERSIONES])
+        CambioCatalogo.objects.bulk_create(cambios)
+
+
+def registrar_cambios(producto_ids, tipo='guardado'):
+    """Añade al registro de cambios los productos indicados (para la sincronización incremental)."""
+    _insertar_cambios([CambioCatalogo(producto_id=producto_id, tipo=tipo) for producto_id in set(producto_ids)])
+
+
+def registrar_referencias():
+    """Nueva versión del catálogo por un cambio en categorías o estancias."""
+    _insertar_cambios([CambioCatalogo(producto_id=0, tipo='referencias')])
+
+
+def productos_de_promociones(promocion_ids):
+    """Ids de los productos afectados por las promociones, directamente o por categoría/estancia."""
+    return set(Producto.objects.filter(
+        Q(promociones__in=promocion_ids)
+        | Q(categoria__promociones__in=promocion_ids)
+        | Q(estancia__promociones__in=promocion_ids)
+    ).values_list('pk', flat=True).distinct())
+
+
+def _imagen(producto):
+    jpeg = (producto.imagen_variantes or {}).get('jpeg')
+    return default_storage.url(jpeg[max(jpeg, key=int)]) if jpeg else producto.imagen
+
+
+def columnas(productos):
+    """
+    Catálogo en formato columnar: una lista por campo en lugar de un objeto por producto,
+    para no repetir los nombres de campo en cada fila.
+    """
+    datos = {columna: [] for columna in COLUMNAS}
+    for producto in productos:
+        datos['id'].append(producto.pk)
+        datos['nombre'].append(producto.nombre)
+        datos['descripcion'].append(producto.descripcion)
+        datos['precio'].append(producto.precio)
+        datos['descuento'].append(producto.descuento_efectivo)
+        datos['precio_con_descuento'].append(round(producto.precio_con_descuento, 2))
+        datos['categoria'].append(producto.categoria_id)
+        datos['estancia'].append(producto.estancia_id)
+        datos['imagen'].append(_imagen(producto))
+        datos['colores'].append(producto.colores)
+        datos['materiales'].append(producto.materiales)
+        datos['peso'].append(producto.peso)
+    return datos
+
+
+def _referencias():
+    return {
+        'categorias': dict(Categoria.objects.values_list('pk', 'nombre')),
+        'estancias': dict(Estancia.objects.values_list('pk', 'nombre')),
+    }
+
+
+def _productos():
+    return Producto.objects.con_descuento_efectivo().defer('fecha_creacion').order_by('pk')
+
+
+def _json(datos):
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def snapshot():
+    """
+    Devuelve (version, {codificación: cuerpo}) del catálogo completo. Se genera y comprime
+    una sola vez por versión y se guarda en caché.
+    """
+    version = version_actual()
+    clave = f'catalogo:snapshot:{version}'
+    variantes = cache.get(clave)
+    if variantes is None:
+        variantes = comprimir(_json({
+            'version': version,
+            **_referencias(),
+            'productos': columnas(_productos()),
+        }))
+        cache.set(clave, variantes, SNAPSHOT_TIMEOUT)
+    return version, variantes
+
+
+def cambios_desde(version):
+    """
+    Productos modificados y borrados después de `version`, con la versión hasta la que llegan.
+    Si cambiaron categorías o estancias se incluyen también sus mapas completos.
+    """
+    ultimo_tipo = {}
+    referencias = False
+    hasta = version
+    for pk, producto_id, tipo in (CambioCatalogo.objects.filter(pk__gt=version)
+                                  .order_by('pk').values_list('pk', 'producto_id', 'tipo')):
+        if tipo == 'referencias':
+            referencias = True
+        else:
+            ultimo_tipo[producto_id] = tipo
+        hasta = pk
+
+    guardados = [producto_id for producto_id, tipo in ultimo_tipo.items() if tipo == 'guardado']
+    return {
+        'version': hasta,
+        **(_referencias() if referencias else {}),
+        'productos': columnas(_productos().filter(pk__in=guardados)),
+        'borrados': sorted(producto_id for producto_id, tipo in ultimo_tipo.items() if tipo == 'borrado'),
+    }
@@ -0,0 +1,53 @@
+import gzip
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+
+CODIFICACIONES = ('br', 'gzip', 'identity') if brotli is not None else ('gzip', 'identity')
+
+
+def comprimir_con(cuerpo, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(cuerpo, quality=5)
+    if codificacion == 'gzip':
+        return gzip.compress(cuerpo, compresslevel=6, mtime=0)
+    return cuerpo
+
+
+def comprimir(cuerpo):
+    """Devuelve el cuerpo en cada codificación disponible: {'identity': ..., 'gzip': ..., 'br': ...}."""
+    return {codificacion: comprimir_con(cuerpo, codificacion) for codificacion in CODIFICACIONES}
+
+
+def codificaciones_aceptadas(request):
+    """Codificaciones del Accept-Encoding de la petición que no están explícitamente rechazadas (q=0)."""
+    aceptadas = set()
+    for parte in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        if nombre and parametros.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            aceptadas.add(nombre.lower())
+    return aceptadas
+
+
+def elegir_codificacion(request, disponibles):
+    """Elige la mejor codificación disponible que acepta el cliente (br, después gzip)."""
+    aceptadas = codificaciones_aceptadas(request)
+    for codificacion in ('br', 'gzip'):
+        if codificacion in disponibles and codificacion in aceptadas:
+            return codificacion
+    return 'identity'
+
+
+def respuesta_precomprimida(request, variantes, content_type='application/json'):
+    """Respuesta con la variante ya comprimida que mejor acepta el cliente."""
+    codificacion = elegir_codificacion(request, variantes)
+    response = HttpResponse(variantes[codificacion], content_type=content_type)
+    if codificacion != 'identity':
+        response['Content-Encoding'] = codificacion
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,93 @@
+"""
+Soporte de la cabecera Idempotency-Key en los POST que crean pedidos, líneas de carrito y
+wishlist. La primera petición inserta la clave como en curso antes de ejecutarse: la
+restricción única (propietario, clave) hace de cerrojo, así que un duplicado concurrente
+falla al insertar y recibe 409 en lugar de ejecutarse dos veces. Al terminar se guarda la
+respuesta y los reintentos la reciben tal cual sin volver a escribir nada.
+"""
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import ClaveIdempotencia
+
+
+class ClaveEnUso(Exception):
+    """Otra petición con la misma clave se está ejecutando."""
+
+
+class ClaveReutilizada(Exception):
+    """La clave ya se usó con un cuerpo distinto."""
+
+
+def propietario_de(request):
+    """
+    Espacio de nombres de las claves. Solo se admite para clientes autenticados: la IP no
+    identifica al cliente (detrás del proxy es la del proxy) y dos clientes compartirían claves.
+    """
+    if request.user and request.user.is_authenticated:
+        return f'usuario:{request.user.pk}'
+    return None
+
+
+def huella_de(request):
+    contenido = b'\n'.join([request.method.encode(), request.path.encode(), request.body])
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def reclamar(propietario, clave, huella):
+    """
+    Registra la clave como en curso. Devuelve None si la petición debe ejecutarse o la
+    ClaveIdempotencia completada cuya respuesta hay que repetir.
+    """
+    ahora = timezone.now()
+    expira = ahora + timedelta(hours=settings.IDEMPOTENCIA_HORAS)
+    try:
+        with transaction.atomic():
+            ClaveIdempotencia.objects.create(propietario=propietario, clave=clave, huella=huella,
+                                             fecha_creacion=ahora, expira=expira)
+        return None
+    except IntegrityError:
+        existente = ClaveIdempotencia.objects.filter(propietario=propietario, clave=clave).first()
+
+    if existente is None:
+        # Se purgó entre el INSERT y la lectura
+        return reclamar(propietario, clave, huella)
+    abandonada = (existente.estado == 'en_curso' and
+                  existente.fecha_creacion <= ahora - timedelta(seconds=settings.IDEMPOTENCIA_BLOQUEO_SEGUNDOS))
+    if existente.expira <= ahora or (abandonada and existente.huella == huella):
+        # Caducada o de una ejecución que no terminó: la toma solo quien gane el UPDATE condicional
+        tomada = ClaveIdempotencia.objects.filter(
+            pk=existente.pk, estado=existente.estado, fecha_creacion=existente.fecha_creacion,
+        ).update(estado='en_curso', huella=huella, codigo=None, respuesta=None, fecha_creacion=ahora, expira=expira)
+        if tomada:
+            return None
+        raise ClaveEnUso(clave)
+    if existente.huella != huella:
+        raise ClaveReutilizada(clave)
+    if existente.estado == 'en_curso':
+        raise ClaveEnUso(clave)
+    return existente
+
+
+def completar(propietario, clave, codigo, respuesta):
+    ClaveIdempotencia.objects.filter(propietario=propietario, clave=clave, estado='en_curso').update(
+        estado='completada', codigo=codigo, respuesta=respuesta,
+    )
+
+
+def liberar(propietario, clave):
+    """Borra la clave de una petición fallida para que el reintento se ejecute de nuevo."""
+    ClaveIdempotencia.objects.filter(propietario=propietario, clave=clave, estado='en_curso').delete()
+
+
+def purgar_claves(lote=5000):
+    """Elimina las claves caducadas por lotes de ids, sin una única transacción larga."""
+    borradas = 0
+    while True:
+        ids = list(ClaveIdempotencia.objects.filter(expira__lte=timezone.now())
+                   .values_list('pk', flat=True)[:lote])
+        if not ids:
+            return borradas
+        borradas += ClaveIdempotencia.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,181 @@
+import hashlib
+import io
+import ipaddress
+import socket
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from .cache import invalidar_catalogo
+from .catalogo import registrar_cambios
+from .models import Producto
+from .tareas import tarea, encolar
+
+ANCHOS = (320, 640, 1024)
+FORMATOS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+REDIRECCIONES_MAXIMAS = 3
+
+# Las subidas pendientes de procesar se guardan fuera de MEDIA_ROOT: no deben ser públicas
+subidas = FileSystemStorage(location=settings.SUBIDAS_ROOT)
+
+
+class ImagenNoValida(Exception):
+    pass
+
+
+def validar_url_imagen(url):
+    """
+    Solo se descargan URLs http(s) cuyo host resuelve a direcciones públicas: la URL la
+    indica el cliente y el worker no debe poder usarse para llegar a la red interna.
+    Devuelve la dirección validada, que es a la que hay que conectar.
+    """
+    partes = urlsplit(url)
+    if partes.scheme not in ('http', 'https') or not partes.hostname:
+        raise ImagenNoValida('La URL de la imagen debe ser http o https')
+    try:
+        direcciones = {info[4][0] for info in socket.getaddrinfo(partes.hostname, partes.port or None,
+                                                                 proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError) as exc:
+        raise ImagenNoValida(f'No se pudo resolver {partes.hostname}') from exc
+    for direccion in direcciones:
+        ip = ipaddress.ip_address(direccion.split('%')[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if (not ip.is_global or ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified):
+            raise ImagenNoValida(f'{partes.hostname} no resuelve a una dirección pública')
+    return min(direcciones)
+
+
+def _pedir(sesion, url, direccion):
+    """
+    GET a `url` conectando a `direccion` y no a lo que resuelva el DNS en ese momento: un
+    host con TTL 0 podría resolver a una dirección pública al validar y a una interna al
+    conectar. El nombre se conserva en la cabecera Host, el SNI y la comprobación del certificado.
+    """
+    import requests
+
+    partes = urlsplit(url)
+    puerto = f':{partes.port}' if partes.port else ''
+    ip = f'[{direccion}]' if ':' in direccion else direccion
+    adaptador = requests.adapters.HTTPAdapter()
+    # Solo se aplican a las conexiones https
+    adaptador.poolmanager.connection_pool_kw.update(server_hostname=partes.hostname,
+                                                    assert_hostname=partes.hostname)
+    sesion.mount(f'{partes.scheme}://', adaptador)
+    return sesion.get(urlunsplit(partes._replace(netloc=ip + puerto)), headers={'Host': partes.hostname + puerto},
+                      timeout=settings.IMAGENES_TIMEOUT, stream=True, allow_redirects=False)
+
+
+def descargar_imagen(url):
+    """
+    Descarga la imagen original respetando el tamaño máximo configurado. Las redirecciones se
+    siguen a mano para validar el destino de cada salto.
+    """
+    # requests y Pillow se importan al usarlos: solo los necesita el worker, no el arranque de la web
+    import requests
+
+    with requests.Session() as sesion:
+        # Sin proxies del entorno: resolverían el host por su cuenta
+        sesion.trust_env = False
+        for _ in range(REDIRECCIONES_MAXIMAS + 1):
+            respuesta = _pedir(sesion, url, validar_url_imagen(url))
+            if not respuesta.is_redirect:
+                break
+            url = urljoin(url, respuesta.headers['Location'])
+            respuesta.close()
+        else:
+            raise ImagenNoValida(f'Más de {REDIRECCIONES_MAXIMAS} redirecciones')
+
+        with respuesta:
+            respuesta.raise_for_status()
+            contenido = io.BytesIO()
+            for bloque in respuesta.iter_content(64 * 1024):
+                contenido.write(bloque)
+                if contenido.tell() > settings.IMAGENES_TAMANO_MAXIMO:
+                    raise ImagenNoValida(f'La imagen supera {settings.IMAGENES_TAMANO_MAXIMO} bytes')
+    return contenido.getvalue()
+
+
+def validar_imagen(contenido):
+    """Comprueba que el contenido es una imagen que Pillow puede abrir."""
+    if len(contenido) > settings.IMAGENES_TAMANO_MAXIMO:
+        raise ImagenNoValida(f'La imagen supera {settings.IMAGENES_TAMANO_MAXIMO} bytes')
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(contenido)) as imagen:
+            imagen.verify()
+    except Exception as exc:
+        raise ImagenNoValida('El archivo no es una imagen válida') from exc
+
+
+def generar_variantes(contenido):
+    """
+    Genera las miniaturas WebP y JPEG a los anchos de ANCHOS (sin ampliar el original).
+    Los nombres llevan el hash del contenido, así que cada archivo es inmutable.
+    Devuelve (hash, variantes) con variantes = {formato: {ancho: ruta}}.
+    """
+    from PIL import Image, ImageOps
+
+    huella = hashlib.sha256(contenido).hexdigest()
+    variantes = {formato: {} for formato in FORMATOS}
+    with Image.open(io.BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        anchos = [ancho for ancho in ANCHOS if ancho <= original.width] or [original.width]
+        for ancho in anchos:
+            miniatura = original.copy()
+            miniatura.thumbnail((ancho, ancho * 10), Image.LANCZOS)
+            for formato, (formato_pil, extension, opciones) in FORMATOS.items():
+                nombre = f'productos/{huella[:20]}-{ancho}.{extension}'
+                if not default_storage.exists(nombre):
+                    salida = io.BytesIO()
+                    miniatura.save(salida, formato_pil, **opciones)
+                    default_storage.save(nombre, ContentFile(salida.getvalue()))
+                variantes[formato][str(ancho)] = nombre
+    return huella, variantes
+
+
+def procesar_imagen_producto(producto_id, contenido=None):
+    """Descarga (si no se proporciona) y procesa la imagen de un producto."""
+    if contenido is None:
+        url = Producto.objects.filter(pk=producto_id).values_list('imagen', flat=True).first()
+        if not url:
+            return False
+        contenido = descargar_imagen(url)
+    huella, variantes = generar_variantes(contenido)
+    actualizado = Producto.objects.filter(pk=producto_id).update(imagen_hash=huella, imagen_variantes=variantes)
+    if actualizado:
+        registrar_cambios([producto_id])
+        invalidar_catalogo()
+    return bool(actualizado)
+
+
+@tarea('procesar_imagen')
+def _procesar_imagen(producto_id, subida=None):
+    contenido = None
+    if subida:
+        with subidas.open(subida) as archivo:
+            contenido = archivo.read()
+    procesar_imagen_producto(producto_id, contenido)
+    if subida:
+        subidas.delete(subida)
+
+
+def encolar_procesado(producto_id, contenido=None):
+    """
+    Encola el procesado de la imagen para el worker. Un archivo subido se guarda antes
+    en SUBIDAS_ROOT, ya que los argumentos de la tarea se guardan como JSON.
+    """
+    subida = None
+    if contenido is not None:
+        subida = subidas.save(hashlib.sha256(contenido).hexdigest(), ContentFile(contenido))
+    encolar('procesar_imagen', producto_id, subida=subida)
+
+
+def url_variante(nombre, request=None):
+    url = default_storage.url(nombre)
+    return request.build_absolute_uri(url) if request is not None else url
@@ -0,0 +1,146 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+from .cache import invalidar_catalogo
+from .models import Producto, ReservaStock, Carrito, Pedido, DetallePedido
+from .ventas import programar_actualizacion
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto_id):
+        super().__init__(f'No hay existencias suficientes del producto {producto_id}')
+        self.producto_id = producto_id
+
+
+def descontar_existencias(producto_id, cantidad):
+    """
+    Descuenta unidades con un UPDATE condicionado (existencias >= cantidad), sin leer
+    antes el valor: dos compras simultáneas nunca pueden dejar el stock en negativo.
+    """
+    if cantidad <= 0:
+        return
+    actualizados = (Producto.objects.filter(pk=producto_id, existencias__gte=cantidad)
+                    .update(existencias=F('existencias') - cantidad))
+    if not actualizados:
+        raise StockInsuficiente(producto_id)
+    # Las respuestas cacheadas del catálogo solo incluyen `stock`: se invalidan si se agota
+    if not Producto.objects.filter(pk=producto_id, existencias__gt=0).exists():
+        transaction.on_commit(invalidar_catalogo)
+
+
+def devolver_existencias(cantidades):
+    """Devuelve unidades a varios productos con un único UPDATE. `cantidades` es {producto_id: unidades}."""
+    cantidades = {producto_id: n for producto_id, n in cantidades.items() if n > 0}
+    if not cantidades:
+        return
+    repuestos = Producto.objects.filter(pk__in=cantidades, existencias=0).exists()
+    Producto.objects.filter(pk__in=cantidades).update(existencias=F('existencias') + Case(
+        *[When(pk=producto_id, then=Value(n)) for producto_id, n in cantidades.items()],
+        output_field=PositiveIntegerField(),
+    ))
+    if repuestos:
+        transaction.on_commit(invalidar_catalogo)
+
+
+def cambiar_unidades(producto_anterior, cantidad_anterior, producto_id, cantidad):
+    """Ajusta el stock cuando una línea ya descontada cambia de producto o de cantidad."""
+    if producto_anterior != producto_id:
+        devolver_existencias({producto_anterior: cantidad_anterior})
+        descontar_existencias(producto_id, cantidad)
+    elif cantidad > cantidad_anterior:
+        descontar_existencias(producto_id, cantidad - cantidad_anterior)
+    else:
+        devolver_existencias({producto_id: cantidad_anterior - cantidad})
+
+
+def devolver_pedidos(pedido_ids):
+    """Devuelve al stock las unidades de las líneas de los pedidos indicados (al cancelarlos)."""
+    cantidades = Counter()
+    for producto_id, cantidad in (DetallePedido.objects.filter(pedido_id__in=pedido_ids)
+                                  .values_list('producto_id', 'cantidad')):
+        cantidades[producto_id] += cantidad
+    devolver_existencias(cantidades)
+
+
+def _expiracion():
+    return timezone.now() + timedelta(minutes=settings.RESERVA_STOCK_MINUTOS)
+
+
+def reservar(producto_id, cantidad, item=None):
+    """Descuenta las unidades y crea la reserva que las retiene hasta la compra o su caducidad."""
+    with transaction.atomic():
+        descontar_existencias(producto_id, cantidad)
+        return ReservaStock.objects.create(producto_id=producto_id, item=item, cantidad=cantidad, expira=_expiracion())
+
+
+def ajustar_reserva(item):
+    """Ajusta la reserva de una línea de carrito a su cantidad actual y renueva su caducidad."""
+    with transaction.atomic():
+        reserva = ReservaStock.objects.select_for_update().filter(item=item).first()
+        if reserva is None:
+            return reservar(item.producto_id, item.cantidad, item)
+        cambiar_unidades(reserva.producto_id, reserva.cantidad, item.producto_id, item.cantidad)
+        reserva.producto_id = item.producto_id
+        reserva.cantidad = item.cantidad
+        reserva.expira = _expiracion()
+        reserva.save(update_fields=['producto', 'cantidad', 'expira'])
+        return reserva
+
+
+def liberar_reservas(reservas):
+    """Borra las reservas del queryset y devuelve sus unidades con un UPDATE en bloque. Devuelve cuántas liberó."""
+    with transaction.atomic():
+        filas = list(reservas.select_for_update().values_list('pk', 'producto_id', 'cantidad'))
+        if not filas:
+            return 0
+        ReservaStock.objects.filter(pk__in=[pk for pk, _, _ in filas]).delete()
+        cantidades = Counter()
+        for _, producto_id, cantidad in filas:
+            cantidades[producto_id] += cantidad
+        devolver_existencias(cantidades)
+    return len(filas)
+
+
+def expirar_reservas(momento=None):
+    """Libera todas las reservas caducadas."""
+    return liberar_reservas(ReservaStock.objects.filter(expira__lte=momento or timezone.now()))
+
+
+def checkout(carrito, direccion_envio, metodo_pago):
+    """
+    Convierte el carrito en un pedido. Las líneas con reserva la consumen; las que la
+    perdieron descuentan ahora sus unidades. Si falta stock no se crea nada.
+    """
+    with transaction.atomic():
+        # Se bloquea el carrito antes de leer sus líneas: un checkout simultáneo del mismo
+        # carrito espera aquí y después lo encuentra vacío
+        Carrito.objects.select_for_update().filter(pk=carrito.pk).exists()
+        items = list(carrito.items.all())
+        if not items:
+            raise ValueError('El carrito está vacío')
+        reservadas = set(ReservaStock.objects.select_for_update()
+                         .filter(item__carrito=carrito).values_list('item_id', flat=True))
+        for item in items:
+            if item.pk not in reservadas:
+                descontar_existencias(item.producto_id, item.cantidad)
+
+        pedido = Pedido.objects.create(
+            usuario_id=carrito.usuario_id,
+            direccion_envio=direccion_envio,
+            metodo_pago=metodo_pago,
+            total=sum(item.precio_total for item in items),
+        )
+        DetallePedido.objects.bulk_create(
+            DetallePedido(pedido=pedido, producto_id=item.producto_id, cantidad=item.cantidad,
+                          precio_total=item.precio_total)
+            for item in items
+        )
+        # Las reservas quedan consumidas por el pedido: se borran sin devolver unidades
+        ReservaStock.objects.filter(item__carrito=carrito).delete()
+        carrito.items.all().delete()
+        fecha = timezone.localdate(pedido.fecha_pedido)
+        programar_actualizacion((fecha, item.producto_id) for item in items)
+    return pedido
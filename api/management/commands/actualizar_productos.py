@@ -0,0 +1,48 @@
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from api.services import filtrar_productos, actualizar_productos
+
+
+class Command(BaseCommand):
+    help = 'Actualiza precio, descuento y/o existencias de muchos productos en una sola transacción.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', help='Lista de ids separados por comas')
+        parser.add_argument('--categoria', type=int)
+        parser.add_argument('--estancia', type=int)
+        parser.add_argument('--precio')
+        parser.add_argument('--descuento', type=int)
+        parser.add_argument('--existencias', type=int)
+
+    def handle(self, *args, **options):
+        ids = None
+        if options['ids']:
+            try:
+                ids = [int(valor) for valor in options['ids'].split(',') if valor.strip()]
+            except ValueError:
+                raise CommandError("'--ids' debe ser una lista de enteros separados por comas")
+        if not ids and options['categoria'] is None and options['estancia'] is None:
+            raise CommandError("Se requiere '--ids', '--categoria' o '--estancia'")
+
+        cambios = {}
+        if options['precio'] is not None:
+            try:
+                cambios['precio'] = Decimal(options['precio'])
+            except InvalidOperation:
+                raise CommandError(f"Precio no válido: {options['precio']}")
+            if cambios['precio'] < 0:
+                raise CommandError("El precio no puede ser negativo")
+        if options['descuento'] is not None:
+            if not 0 <= options['descuento'] <= 100:
+                raise CommandError("El descuento debe estar entre 0 y 100")
+            cambios['descuento'] = options['descuento']
+        if options['existencias'] is not None:
+            if options['existencias'] < 0:
+                raise CommandError("Las existencias no pueden ser negativas")
+            cambios['existencias'] = options['existencias']
+        if not cambios:
+            raise CommandError("Se requiere al menos un cambio: '--precio', '--descuento' o '--existencias'")
+
+        productos = filtrar_productos(ids, options['categoria'], options['estancia'])
+        actualizados = actualizar_productos(productos, cambios)
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} productos actualizados'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.services import aplicar_ventanas_promociones
+
+
+class Command(BaseCommand):
+    help = 'Activa y expira las promociones según su ventana temporal (pensado para ejecutarse desde cron).'
+
+    def handle(self, *args, **options):
+        activadas, expiradas = aplicar_ventanas_promociones()
+        self.stdout.write(self.style.SUCCESS(f'{activadas} promociones activadas, {expiradas} expiradas'))
@@ -0,0 +1,64 @@
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from api.models import Usuario
+
+# Control de transacciones: no cuenta como consulta
+CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+class Command(BaseCommand):
+    help = ('Mide consultas SQL y latencia por petición de registro, login y actualización de perfil. '
+            'Los usuarios creados se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        cliente = Client(HTTP_HOST='localhost')
+        prefijo = f'benchmark-{uuid.uuid4().hex[:8]}'
+        contraseña = 'benchmark-auth'
+        peticiones = options['peticiones']
+
+        def registro(i):
+            return cliente.post('/api/usuarios/registro/', {
+                'nombre': 'Bench', 'apellido': 'Auth', 'email': f'{prefijo}-{i}@example.com',
+                'contraseña': contraseña, 'confirmar_contraseña': contraseña,
+                'direccion': 'Calle Mayor 1', 'telefono': '600000000',
+            }, content_type='application/json')
+
+        try:
+            ids = []
+            resultados = [('registro', self._medir(registro, peticiones, ids))]
+            resultados.append(('registro duplicado', self._medir(lambda i: registro(0), peticiones)))
+            resultados.append(('login', self._medir(lambda i: cliente.post(
+                '/api/usuarios/login/', {'email': f'{prefijo}-{i}@example.com', 'contraseña': contraseña},
+                content_type='application/json'), peticiones)))
+            resultados.append(('actualizar', self._medir(lambda i: cliente.put(
+                f'/api/usuarios/{ids[i]}/actualizar/', {'direccion': f'Calle Mayor {i}'},
+                content_type='application/json'), peticiones)))
+        finally:
+            Usuario.objects.filter(email__startswith=prefijo).delete()
+
+        self.stdout.write(f"{'ruta':<20}{'estado':>8}{'consultas':>11}{'p50 ms':>9}{'p95 ms':>9}")
+        for nombre, (estado, consultas, tiempos) in resultados:
+            p95 = statistics.quantiles(tiempos, n=20)[-1] if len(tiempos) > 1 else tiempos[0]
+            self.stdout.write(f"{nombre:<20}{estado:>8}{consultas:>11}"
+                              f"{statistics.median(tiempos):>9.1f}{p95:>9.1f}")
+
+    def _medir(self, peticion, peticiones, ids=None):
+        tiempos = []
+        consultas = 0
+        for i in range(peticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                respuesta = peticion(i)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = max(consultas, sum(not consulta['sql'].startswith(CONTROL) for consulta in capturadas))
+            if ids is not None and respuesta.status_code == 201:
+                ids.append(respuesta.json()['usuario']['id'])
+        return respuesta.status_code, consultas, tiempos
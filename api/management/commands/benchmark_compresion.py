@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test import Client
+from api.cache import invalidar_catalogo
+from api.compresion import CODIFICACIONES
+
+RUTAS = (
+    '/api/productos/',
+    '/api/productos/ofertas/',
+    '/api/categorias/',
+    '/api/catalogo/snapshot/',
+)
+
+
+class Command(BaseCommand):
+    help = ('Mide bytes y tiempo de CPU por petición de los endpoints del catálogo para cada '
+            'codificación, con la caché fría (se invalida antes de cada petición) y caliente.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=20)
+        parser.add_argument('--ruta', action='append', dest='rutas', help='Ruta a medir (repetible)')
+
+    def handle(self, *args, **options):
+        cliente = Client(HTTP_HOST='localhost')
+        self.stdout.write(f"{'ruta':<28}{'codificación':<14}{'bytes':>9}{'fría ms':>10}{'caliente ms':>13}")
+        for ruta in options['rutas'] or RUTAS:
+            for codificacion in CODIFICACIONES:
+                cabeceras = {'HTTP_ACCEPT_ENCODING': codificacion, 'HTTP_ACCEPT': 'application/json'}
+                fria = self._medir(cliente, ruta, cabeceras, options['peticiones'], invalidar=True)
+                caliente, tamano = self._medir(cliente, ruta, cabeceras, options['peticiones'], invalidar=False,
+                                               con_tamano=True)
+                self.stdout.write(f"{ruta:<28}{codificacion:<14}{tamano:>9}{fria:>10.2f}{caliente:>13.2f}")
+
+    def _medir(self, cliente, ruta, cabeceras, peticiones, invalidar, con_tamano=False):
+        cliente.get(ruta, **cabeceras)
+        total = 0.0
+        tamano = 0
+        for _ in range(peticiones):
+            if invalidar:
+                invalidar_catalogo()
+            inicio = time.process_time()
+            respuesta = cliente.get(ruta, **cabeceras)
+            total += time.process_time() - inicio
+            tamano = len(respuesta.content)
+        media = total / peticiones * 1000
+        return (media, tamano) if con_tamano else media
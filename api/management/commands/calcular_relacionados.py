@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.cache import invalidar_catalogo
+from api.recomendaciones import comprados_juntos, similares, guardar_relacionados
+
+
+class Command(BaseCommand):
+    help = 'Precalcula los productos relacionados (comprados juntos y similares). Pensado para ejecutarse cada noche.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Vecinos guardados por producto y tipo')
+        parser.add_argument('--tipo', choices=['compra', 'similar'], help='Calcula solo un tipo')
+        parser.add_argument('--semilla', type=int, default=0,
+                            help='Semilla de la muestra de candidatos de los similares')
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError("'--top' debe ser mayor que 0")
+
+        calculos = {
+            'compra': comprados_juntos,
+            'similar': lambda top: similares(top, options['semilla']),
+        }
+        for tipo, calcular in calculos.items():
+            if options['tipo'] and options['tipo'] != tipo:
+                continue
+            inicio = time.monotonic()
+            guardados = guardar_relacionados(tipo, calcular(options['top']))
+            self.stdout.write(self.style.SUCCESS(
+                f'{tipo}: {guardados} relaciones guardadas en {time.monotonic() - inicio:.1f}s'
+            ))
+        invalidar_catalogo()
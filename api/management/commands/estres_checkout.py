@@ -0,0 +1,70 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from api.inventario import StockInsuficiente, reservar
+from api.models import Categoria, Producto
+
+
+class Command(BaseCommand):
+    help = ('Prueba de concurrencia del stock: muchos hilos reservan unidades del mismo producto a la vez '
+            'y se comprueba que nunca se vende más de lo que hay.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=16)
+        parser.add_argument('--existencias', type=int, default=500)
+        parser.add_argument('--unidades', type=int, default=1, help='Unidades por reserva')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            categoria, creada = Categoria.objects.get_or_create(
+                nombre='__estres__', defaults={'descripcion': 'Prueba de concurrencia'})
+            producto = Producto.objects.create(
+                nombre='__estres__', descripcion='Prueba de concurrencia', precio=1, peso=1,
+                categoria=categoria, imagen='https://example.com/estres.jpg', existencias=options['existencias'],
+            )
+
+        resultados = {'reservas': 0, 'rechazos': 0, 'errores': 0}
+        bloqueo = threading.Lock()
+
+        def comprar():
+            try:
+                while True:
+                    try:
+                        reservar(producto.pk, options['unidades'])
+                        clave = 'reservas'
+                    except StockInsuficiente:
+                        with bloqueo:
+                            resultados['rechazos'] += 1
+                        return
+                    except Exception:
+                        clave = 'errores'
+                    with bloqueo:
+                        resultados[clave] += 1
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar) for _ in range(options['hilos'])]
+        inicio = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        segundos = time.monotonic() - inicio
+
+        producto.refresh_from_db()
+        vendidas = resultados['reservas'] * options['unidades']
+        sobreventa = max(vendidas - options['existencias'], 0)
+        self.stdout.write(
+            f"{resultados['reservas']} reservas en {segundos:.2f}s ({resultados['reservas'] / segundos:.0f}/s), "
+            f"{resultados['errores']} errores, existencias finales {producto.existencias}, "
+            f"unidades vendidas {vendidas} de {options['existencias']}"
+        )
+        producto.delete()
+        if creada:
+            categoria.delete()
+
+        if sobreventa or producto.existencias + vendidas != options['existencias']:
+            self.stdout.write(self.style.ERROR(f'Sobreventa de {sobreventa} unidades'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin sobreventa'))
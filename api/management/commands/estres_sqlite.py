@@ -0,0 +1,88 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PERFILES = {
+    # Configuración de SQLite por defecto: journal DELETE y transacciones diferidas
+    'por defecto': ({}, 'BEGIN'),
+    # Configuración del proyecto (settings.SQLITE_PRAGMAS + BEGIN IMMEDIATE)
+    'ajustado': (settings.SQLITE_PRAGMAS, 'BEGIN IMMEDIATE'),
+}
+
+
+def _preparar(ruta, pragmas):
+    conexion = sqlite3.connect(ruta)
+    for nombre, valor in pragmas.items():
+        conexion.execute(f'PRAGMA {nombre}={valor}')
+    conexion.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, carrito INTEGER, cantidad INTEGER)')
+    conexion.executemany('INSERT INTO item (carrito, cantidad) VALUES (?, 1)', [(n % 100,) for n in range(1000)])
+    conexion.commit()
+    conexion.close()
+
+
+def _trabajador(ruta, pragmas, inicio_transaccion, segundos, proporcion_escrituras, semilla):
+    """Mezcla lecturas y transacciones lectura-escritura como las de carritos y pedidos."""
+    aleatorio = random.Random(semilla)
+    conexion = sqlite3.connect(ruta, isolation_level=None)
+    for nombre, valor in pragmas.items():
+        conexion.execute(f'PRAGMA {nombre}={valor}')
+    resultado = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        carrito = aleatorio.randrange(100)
+        try:
+            if aleatorio.random() < proporcion_escrituras:
+                conexion.execute(inicio_transaccion)
+                try:
+                    conexion.execute('SELECT SUM(cantidad) FROM item WHERE carrito = ?', (carrito,)).fetchone()
+                    conexion.execute('INSERT INTO item (carrito, cantidad) VALUES (?, 1)', (carrito,))
+                    conexion.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    conexion.execute('ROLLBACK')
+                    raise
+                resultado['escrituras'] += 1
+            else:
+                conexion.execute('SELECT COUNT(*), SUM(cantidad) FROM item WHERE carrito = ?', (carrito,)).fetchone()
+                resultado['lecturas'] += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            resultado['bloqueos'] += 1
+    conexion.close()
+    return resultado
+
+
+class Command(BaseCommand):
+    help = ('Prueba de concurrencia sobre SQLite: compara errores "database is locked" y rendimiento '
+            'entre la configuración por defecto y la ajustada del proyecto.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4, help='Procesos concurrentes (como workers de gunicorn)')
+        parser.add_argument('--segundos', type=float, default=5)
+        parser.add_argument('--escrituras', type=float, default=0.3, help='Proporción de operaciones de escritura')
+
+    def handle(self, *args, **options):
+        for perfil, (pragmas, inicio_transaccion) in PERFILES.items():
+            with tempfile.TemporaryDirectory() as directorio:
+                ruta = os.path.join(directorio, 'estres.sqlite3')
+                _preparar(ruta, pragmas)
+                with ProcessPoolExecutor(max_workers=options['procesos']) as pool:
+                    futuros = [
+                        pool.submit(_trabajador, ruta, pragmas, inicio_transaccion, options['segundos'],
+                                    options['escrituras'], semilla)
+                        for semilla in range(options['procesos'])
+                    ]
+                    resultados = [futuro.result() for futuro in futuros]
+
+            total = {clave: sum(r[clave] for r in resultados) for clave in ('lecturas', 'escrituras', 'bloqueos')}
+            operaciones = total['lecturas'] + total['escrituras']
+            self.stdout.write(
+                f"{perfil:>12}: {operaciones / options['segundos']:9.0f} op/s  "
+                f"({total['escrituras'] / options['segundos']:.0f} escrituras/s)  "
+                f"{total['bloqueos']} errores de bloqueo"
+            )
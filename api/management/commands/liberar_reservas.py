@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.inventario import expirar_reservas
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al stock las unidades de las reservas caducadas (pensado para ejecutarse desde cron).'
+
+    def handle(self, *args, **options):
+        liberadas = expirar_reservas()
+        self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas liberadas'))
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.imagenes import procesar_imagen_producto
+from api.models import Producto
+
+
+def _procesar(producto_id):
+    try:
+        return producto_id, procesar_imagen_producto(producto_id), None
+    except Exception as exc:
+        return producto_id, False, exc
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas de las imágenes de productos existentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Reprocesa también los productos ya procesados')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(imagen='')
+        if not options['todos']:
+            productos = productos.filter(imagen_hash='')
+        ids = list(productos.values_list('pk', flat=True))
+
+        correctos = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for futuro in as_completed(pool.submit(_procesar, producto_id) for producto_id in ids):
+                producto_id, procesado, error = futuro.result()
+                if procesado:
+                    correctos += 1
+                elif error is not None:
+                    self.stderr.write(f'Producto {producto_id}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'{correctos} de {len(ids)} imágenes procesadas'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.idempotencia import purgar_claves
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes las claves Idempotency-Key caducadas (pensado para ejecutarse desde cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Claves borradas por sentencia')
+
+    def handle(self, *args, **options):
+        borradas = purgar_claves(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{borradas} claves caducadas eliminadas'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from api.models import Pedido
+from api.ventas import reconstruir_ventas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el agregado diario de ventas a partir del histórico de pedidos, por bloques de días.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD); por defecto, el primer pedido')
+        parser.add_argument('--hasta', help='Fecha final incluida (AAAA-MM-DD); por defecto, el último pedido')
+        parser.add_argument('--dias-por-bloque', type=int, default=30)
+
+    def handle(self, *args, **options):
+        limites = Pedido.objects.aggregate(primero=Min('fecha_pedido'), ultimo=Max('fecha_pedido'))
+        if limites['primero'] is None:
+            self.stdout.write('No hay pedidos que agregar')
+            return
+
+        desde = self._fecha(options['desde']) or timezone.localdate(limites['primero'])
+        hasta = self._fecha(options['hasta']) or timezone.localdate(limites['ultimo'])
+        if desde > hasta:
+            raise CommandError("'--desde' no puede ser posterior a '--hasta'")
+        if options['dias_por_bloque'] < 1:
+            raise CommandError("'--dias-por-bloque' debe ser mayor que 0")
+
+        creadas = reconstruir_ventas(desde, hasta, options['dias_por_bloque'])
+        self.stdout.write(self.style.SUCCESS(f'{creadas} filas de ventas generadas entre {desde} y {hasta}'))
+
+    def _fecha(self, valor):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'Fecha no válida: {valor}')
+        return fecha
@@ -0,0 +1,102 @@
+import os
+import signal
+import socket
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+from api.tareas import reclamar_tareas, ejecutar_tarea, recuperar_bloqueadas, purgar_tareas, metricas
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de tareas en segundo plano.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=1, help='Número de hilos trabajando en paralelo')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando no hay tareas')
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina')
+        parser.add_argument('--metricas', action='store_true', help='Muestra las métricas de la cola y termina')
+        parser.add_argument('--purgar', type=int, metavar='DIAS',
+                            help='Elimina las tareas completadas hace más de DIAS días y termina')
+
+    def handle(self, *args, **options):
+        if options['metricas']:
+            self._mostrar_metricas()
+            return
+        if options['purgar'] is not None:
+            self.stdout.write(f"{purgar_tareas(options['purgar'])} tareas eliminadas")
+            return
+        if options['concurrencia'] < 1:
+            raise CommandError("'--concurrencia' debe ser mayor que 0")
+
+        self.parar = threading.Event()
+        self.contadores = {'completadas': 0, 'fallidas': 0}
+        self.bloqueo = threading.Lock()
+        signal.signal(signal.SIGTERM, lambda *_: self.parar.set())
+        signal.signal(signal.SIGINT, lambda *_: self.parar.set())
+
+        base = f'{socket.gethostname()}:{os.getpid()}'
+        hilos = [
+            threading.Thread(target=self._trabajar, args=(f'{base}:{n}', options), daemon=True)
+            for n in range(options['concurrencia'])
+        ]
+        self._recuperar()
+        inicio = ultima_recuperacion = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        while any(hilo.is_alive() for hilo in hilos):
+            for hilo in hilos:
+                hilo.join(timeout=0.5)
+            # Las tareas de otro worker que murió se recuperan aunque este no se reinicie
+            if time.monotonic() - ultima_recuperacion >= settings.TAREAS_RECUPERAR_CADA:
+                self._recuperar()
+                ultima_recuperacion = time.monotonic()
+        connection.close()
+
+        segundos = time.monotonic() - inicio
+        total = self.contadores['completadas'] + self.contadores['fallidas']
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.contadores['completadas']} completadas, {self.contadores['fallidas']} con error "
+            f"en {segundos:.1f}s ({total / segundos if segundos else 0:.1f} tareas/s)"
+        ))
+
+    def _recuperar(self):
+        close_old_connections()
+        try:
+            recuperadas = recuperar_bloqueadas()
+        except DatabaseError as exc:
+            self.stderr.write(f'Error al recuperar tareas bloqueadas: {exc}')
+            return
+        if recuperadas:
+            self.stdout.write(f'{recuperadas} tareas bloqueadas devueltas a la cola')
+
+    def _trabajar(self, worker, options):
+        try:
+            while not self.parar.is_set():
+                close_old_connections()
+                try:
+                    tareas = reclamar_tareas(worker)
+                except DatabaseError as exc:
+                    self.stderr.write(f'{worker}: error al reclamar tareas: {exc}')
+                    self.parar.wait(options['intervalo'])
+                    continue
+                if not tareas:
+                    if options['una_vez']:
+                        return
+                    self.parar.wait(options['intervalo'])
+                    continue
+                for tarea in tareas:
+                    correcta = ejecutar_tarea(tarea)
+                    with self.bloqueo:
+                        self.contadores['completadas' if correcta else 'fallidas'] += 1
+        finally:
+            connection.close()
+
+    def _mostrar_metricas(self):
+        datos = metricas()
+        for estado, total in sorted(datos['por_estado'].items()):
+            self.stdout.write(f'{estado}: {total}')
+        for fila in datos['por_tarea']:
+            media = fila['duracion_media'].total_seconds() * 1000 if fila['duracion_media'] else 0
+            self.stdout.write(f"{fila['nombre']}: {fila['total']} completadas, {media:.0f} ms de media")
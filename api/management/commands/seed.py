@@ -0,0 +1,69 @@
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from api import semilla
+from api.cache import invalidar_catalogo
+from api.ventas import reconstruir_ventas
+
+# Orden de generación: cada tabla solo referencia a las anteriores
+TABLAS = ('usuarios', 'productos', 'wishlists', 'carritos', 'pedidos')
+
+
+def _generar(argumentos):
+    try:
+        return semilla.generar_bloque(*argumentos)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Genera datos de prueba realistas y deterministas (usuarios, catálogo, carritos, wishlists y pedidos) '
+            'a la escala indicada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=1, help='Misma semilla, mismos datos')
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help='Multiplicador de filas: 1 = 1000 usuarios, 200 productos y 2000 pedidos')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos que se reparten los bloques')
+        parser.add_argument('--dias', type=int, default=365, help='Días de histórico de pedidos')
+        parser.add_argument('--ventas', action='store_true', help='Reconstruye después el agregado de ventas')
+
+    def handle(self, *args, **options):
+        if options['escala'] <= 0 or options['batch_size'] < 1 or options['procesos'] < 1 or options['dias'] < 1:
+            raise CommandError("'--escala', '--batch-size', '--procesos' y '--dias' deben ser mayores que 0")
+
+        plan = semilla.plan(options['semilla'], options['escala'], options['dias'])
+        semilla.crear_referencias(plan)
+        inicio = time.monotonic()
+
+        ejecutor = None
+        if options['procesos'] > 1:
+            # Los procesos hijos no deben heredar la conexión abierta del padre
+            connections.close_all()
+            ejecutor = ProcessPoolExecutor(options['procesos'])
+        try:
+            for tabla in TABLAS:
+                inicio_tabla = time.monotonic()
+                tareas = [(plan, tabla, bloque, options['batch_size']) for bloque in semilla.bloques(plan, tabla)]
+                filas = sum(ejecutor.map(_generar, tareas) if ejecutor
+                            else (semilla.generar_bloque(*tarea) for tarea in tareas))
+                segundos = time.monotonic() - inicio_tabla
+                self.stdout.write(f'{tabla}: {filas} filas en {segundos:.1f}s ({filas / max(segundos, 1e-9):.0f}/s)')
+        finally:
+            if ejecutor:
+                ejecutor.shutdown()
+
+        semilla.reiniciar_secuencias()
+        invalidar_catalogo()
+        if options['ventas'] and plan['pedidos'][1]:
+            hoy = timezone.localdate(plan['ahora'])
+            creadas = reconstruir_ventas(hoy - timedelta(days=options['dias']), hoy)
+            self.stdout.write(f'ventas: {creadas} filas de agregado')
+        self.stdout.write(self.style.SUCCESS(
+            f"Semilla {options['semilla']} cargada en {time.monotonic() - inicio:.1f}s "
+            f"(contraseña de los usuarios: {semilla.CONTRASEÑA})"
+        ))
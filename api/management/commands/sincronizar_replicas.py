@@ -0,0 +1,28 @@
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copia la base SQLite principal a las réplicas SQLite configuradas (simulación local de réplicas).'
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('La base principal no es SQLite: las réplicas las mantiene el servidor de base de datos')
+
+        replicas = [alias for alias in settings.DATABASES_LECTURA
+                    if connections[alias].vendor == 'sqlite' and alias != 'lectura']
+        if not replicas:
+            raise CommandError('No hay réplicas SQLite en DATABASE_REPLICA_URLS')
+
+        origen = connections[DEFAULT_DB_ALIAS]
+        origen.ensure_connection()
+        for alias in replicas:
+            connections[alias].close()
+            destino = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                origen.connection.backup(destino)
+            finally:
+                destino.close()
+            self.stdout.write(self.style.SUCCESS(f'{alias} sincronizada'))
@@ -0,0 +1,101 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un intérprete nuevo para medir un arranque en frío real: importa la
+# aplicación WSGI y le pasa una petición GET como haría gunicorn
+ARRANQUE = """
+import json, os, sys, time
+inicio = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'compactlifes.settings')
+from compactlifes.wsgi import application
+importada = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+entorno = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': 'localhost', 'HTTP_ACCEPT': 'application/json'}
+setup_testing_defaults(entorno)
+estado = []
+respuesta = application(entorno, lambda status, headers, exc_info=None: estado.append(status))
+b''.join(respuesta)
+getattr(respuesta, 'close', lambda: None)()
+fin = time.perf_counter()
+print(json.dumps({'importar': importada - inicio, 'peticion': fin - importada, 'estado': estado[0]}))
+"""
+LINEA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)$')
+
+
+class Command(BaseCommand):
+    help = ('Mide el arranque en frío: tiempo de importación por módulo (python -X importtime) y tiempo '
+            'hasta la primera respuesta de la aplicación WSGI. Falla si se supera el presupuesto.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ruta', default='/api/categorias/', help='Ruta de la primera petición')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se informa la mediana')
+        parser.add_argument('--modulos', type=int, default=15, help='Módulos más lentos a mostrar')
+        parser.add_argument('--produccion', action='store_true', help='Arranca con DEBUG=False')
+        parser.add_argument('--presupuesto-ms', type=float, default=settings.ARRANQUE_PRESUPUESTO_MS,
+                            help='Tiempo máximo hasta la primera respuesta (0 para no comprobarlo)')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError("'--repeticiones' debe ser mayor que 0")
+
+        entorno = dict(os.environ)
+        if options['produccion']:
+            entorno['DEBUG'] = 'False'
+
+        medidas = []
+        for _ in range(options['repeticiones']):
+            inicio = time.perf_counter()
+            proceso = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', ARRANQUE, options['ruta']],
+                cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+            )
+            total = time.perf_counter() - inicio
+            if proceso.returncode != 0:
+                raise CommandError(f'El arranque falló:\n{proceso.stderr[-2000:]}')
+            resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+            medidas.append((total, resultado['importar'], resultado['peticion'], resultado['estado']))
+
+        self._modulos(proceso.stderr, options['modulos'])
+
+        total, importar, peticion = (statistics.median(medida[i] for medida in medidas) * 1000 for i in range(3))
+        primera_respuesta = importar + peticion
+        self.stdout.write(
+            f"\nMediana de {len(medidas)} arranques: proceso {total:.0f} ms, importar la aplicación {importar:.0f} ms, "
+            f"primera petición ({options['ruta']}, {medidas[-1][3]}) {peticion:.0f} ms"
+        )
+
+        presupuesto = options['presupuesto_ms']
+        if presupuesto and primera_respuesta > presupuesto:
+            raise CommandError(f'Primera respuesta en {primera_respuesta:.0f} ms, por encima del presupuesto '
+                               f'de {presupuesto:.0f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Primera respuesta en {primera_respuesta:.0f} ms'
+            + (f' (presupuesto {presupuesto:.0f} ms)' if presupuesto else '')
+        ))
+
+    def _modulos(self, salida, cuantos):
+        """Módulos de primer nivel (paquetes) y módulos individuales más lentos de importar."""
+        modulos = []
+        paquetes = {}
+        for linea in salida.splitlines():
+            coincidencia = LINEA_IMPORTTIME.match(linea)
+            if not coincidencia:
+                continue
+            propio, acumulado, nombre = coincidencia.groups()
+            modulos.append((int(propio), int(acumulado), nombre))
+            raiz = nombre.split('.')[0]
+            paquetes[raiz] = paquetes.get(raiz, 0) + int(propio)
+
+        self.stdout.write(f"{'paquete':<32}{'ms':>9}")
+        for nombre, propio in sorted(paquetes.items(), key=lambda item: -item[1])[:cuantos]:
+            self.stdout.write(f'{nombre:<32}{propio / 1000:>9.1f}')
+        self.stdout.write(f"\n{'módulo':<48}{'propio ms':>11}{'acumulado ms':>14}")
+        for propio, acumulado, nombre in sorted(modulos, reverse=True)[:cuantos]:
+            self.stdout.write(f'{nombre:<48}{propio / 1000:>11.1f}{acumulado / 1000:>14.1f}')
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:46
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_alter_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Promocion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descuento', models.PositiveIntegerField(validators=[django.core.validators.MaxValueValidator(100)])),
+                ('fecha_inicio', models.DateTimeField()),
+                ('fecha_fin', models.DateTimeField()),
+                ('estado', models.CharField(choices=[('programada', 'Programada'), ('activa', 'Activa'), ('expirada', 'Expirada')], default='programada', max_length=10)),
+                ('categorias', models.ManyToManyField(blank=True, related_name='promociones', to='api.categoria')),
+                ('estancias', models.ManyToManyField(blank=True, related_name='promociones', to='api.estancia')),
+                ('productos', models.ManyToManyField(blank=True, related_name='promociones', to='api.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha_inicio', 'fecha_fin'], name='api_promoci_fecha_i_bb4e63_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialEstadoPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=10)),
+                ('estado_nuevo', models.CharField(choices=[('pendiente', 'Pendiente'), ('pagado', 'Pagado'), ('enviado', 'Enviado'), ('entregado', 'Entregado'), ('cancelado', 'Cancelado')], max_length=10)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['fecha', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha_pedido'], name='api_pedido_estado_4e591f_idx'),
+        ),
+        migrations.AddField(
+            model_name='historialestadopedido',
+            name='pedido',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial', to='api.pedido'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Hasta ahora solo se sabía si había stock, no cuántas unidades: los productos disponibles
+# empiezan con una unidad y las existencias reales se cargan después (actualizar_productos)
+EXISTENCIAS_INICIALES = 1
+
+
+def existencias_iniciales(apps, schema_editor):
+    Producto = apps.get_model('api', 'Producto')
+    Producto.objects.filter(stock=True).update(existencias=EXISTENCIAS_INICIALES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_tarea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='existencias',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(existencias_iniciales, migrations.RunPython.noop),
+        # No se puede convertir un campo normal en GeneratedField: se elimina y se vuelve a crear
+        migrations.RemoveField(
+            model_name='producto',
+            name='stock',
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('existencias__gt', 0)), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField(db_index=True)),
+                ('item', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reserva', to='api.itemcarrito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='api.producto')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.6 on 2026-10-19 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_existencias_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField()),
+                ('tipo', models.CharField(choices=[('guardado', 'Guardado'), ('borrado', 'Borrado')], max_length=10)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
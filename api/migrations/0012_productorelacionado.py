@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_cambiocatalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('compra', 'Comprados juntos'), ('similar', 'Similares')], max_length=10)),
+                ('puntuacion', models.FloatField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionados', to='api.producto')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recomendado_en', to='api.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'tipo', '-puntuacion'], name='api_product_product_f37814_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'tipo', 'relacionado'), name='producto_relacionado_unico')],
+            },
+        ),
+    ]
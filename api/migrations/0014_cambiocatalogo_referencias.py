@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cambiocatalogo',
+            name='tipo',
+            field=models.CharField(choices=[('guardado', 'Guardado'), ('borrado', 'Borrado'), ('referencias', 'Categorías y estancias')], max_length=12),
+        ),
+    ]
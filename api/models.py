@@ -1,5 +1,10 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.hashers import make_password, check_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
 import json
 
@@ -13,10 +18,17 @@ class Usuario(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
 
+    # request.user es el Usuario del token (api.auth.UsuarioJWTAuthentication)
+    is_authenticated = True
+    is_anonymous = False
+
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
     
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'contraseña' not in update_fields:
+            return super().save(*args, **kwargs)
         if self.contraseña and not self.contraseña.startswith('pbkdf2_sha256$'):
             self.contraseña = make_password(self.contraseña)
         super().save(*args, **kwargs)
@@ -39,27 +51,62 @@ class Estancia(models.Model):
     def __str__(self):
         return self.nombre
 
+class ProductoQuerySet(models.QuerySet):
+    def con_descuento_efectivo(self, momento=None):
+        """
+        Anota `descuento_efectivo`: el mayor entre el descuento propio del producto y el de
+        las promociones vigentes que lo incluyen directamente, por categoría o por estancia.
+        Se resuelve en la propia consulta con subconsultas correlacionadas.
+        """
+        momento = momento or timezone.now()
+        vigentes = Promocion.objects.vigentes(momento).order_by('-descuento').values('descuento')
+        por_producto = vigentes.filter(productos=OuterRef('pk'))[:1]
+        por_categoria = vigentes.filter(categorias=OuterRef('categoria_id'))[:1]
+        por_estancia = vigentes.filter(estancias=OuterRef('estancia_id'))[:1]
+        return self.annotate(descuento_efectivo=Greatest(
+            'descuento',
+            Coalesce(Subquery(por_producto), Value(0)),
+            Coalesce(Subquery(por_categoria), Value(0)),
+            Coalesce(Subquery(por_estancia), Value(0)),
+            output_field=models.PositiveIntegerField(),
+        ))
+
+    def para_catalogo(self):
+        """Queryset usado por los listados del catálogo: relaciones y descuento efectivo incluidos."""
+        return self.select_related('categoria', 'estancia').con_descuento_efectivo()
+
 class Producto(models.Model):
     nombre = models.CharField(max_length=100, null=False, blank=False)
     descripcion = models.TextField(null=False, blank=False)
     precio = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)  
     descuento = models.PositiveIntegerField(default=0)  
-    stock = models.BooleanField(default=True)
+    existencias = models.PositiveIntegerField(default=0)
+    # Compatibilidad con los clientes que solo leen si hay stock: lo calcula la base de datos
+    stock = models.GeneratedField(
+        expression=models.ExpressionWrapper(models.Q(existencias__gt=0), output_field=models.BooleanField()),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='productos')
     estancia = models.ForeignKey(Estancia, on_delete=models.CASCADE, related_name='productos', null=True)
     imagen = models.URLField(max_length=500)
+    imagen_hash = models.CharField(max_length=64, blank=True, default='')
+    imagen_variantes = models.JSONField(default=dict, blank=True)
     colores = models.JSONField(default=list)
     materiales = models.JSONField(default=list)
     peso = models.FloatField(null=False, blank=False)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductoQuerySet.as_manager()
+
     def __str__(self):
         return self.nombre
 
     @property
     def precio_con_descuento(self):
-        """Calcula el precio final aplicando el descuento."""
-        return self.precio * (Decimal('1') - Decimal(self.descuento) / Decimal('100'))
+        """Calcula el precio final aplicando el descuento (el efectivo si viene anotado)."""
+        descuento = getattr(self, 'descuento_efectivo', self.descuento)
+        return self.precio * (Decimal('1') - Decimal(descuento) / Decimal('100'))
     
     @property
     def colores_formateados(self):
@@ -93,6 +140,35 @@ class Producto(models.Model):
         except Exception:
             return str(self.materiales)
 
+class PromocionQuerySet(models.QuerySet):
+    def vigentes(self, momento=None):
+        """Promociones cuya ventana incluye el momento indicado."""
+        momento = momento or timezone.now()
+        return self.filter(fecha_inicio__lte=momento, fecha_fin__gt=momento)
+
+class Promocion(models.Model):
+    ESTADOS = [
+        ('programada', 'Programada'),
+        ('activa', 'Activa'),
+        ('expirada', 'Expirada'),
+    ]
+    nombre = models.CharField(max_length=100, null=False, blank=False)
+    descuento = models.PositiveIntegerField(validators=[MaxValueValidator(100)])
+    fecha_inicio = models.DateTimeField()
+    fecha_fin = models.DateTimeField()
+    productos = models.ManyToManyField(Producto, blank=True, related_name='promociones')
+    categorias = models.ManyToManyField(Categoria, blank=True, related_name='promociones')
+    estancias = models.ManyToManyField(Estancia, blank=True, related_name='promociones')
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='programada')
+
+    objects = PromocionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['fecha_inicio', 'fecha_fin'])]
+
+    def __str__(self):
+        return f"{self.nombre} (-{self.descuento}%)"
+
 class Servicio(models.Model):
     nombre = models.CharField(max_length=100, null=False, blank=False)
     descripcion = models.TextField(null=False, blank=False)
@@ -127,6 +203,17 @@ class ItemCarrito(models.Model):
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} en carrito {self.carrito.id}"
 
+class ReservaStock(models.Model):
+    """Unidades ya descontadas de las existencias para un carrito, hasta que se compran o caducan."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    # Si se borra la línea la reserva queda huérfana y devuelve sus unidades al caducar
+    item = models.OneToOneField(ItemCarrito, on_delete=models.SET_NULL, related_name='reserva', null=True, blank=True)
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} hasta {self.expira}"
+
 class Pedido(models.Model):
     ESTADOS = [
         ('pendiente', 'Pendiente'),
@@ -135,6 +222,13 @@ class Pedido(models.Model):
         ('entregado', 'Entregado'),
         ('cancelado', 'Cancelado'),
     ]
+    TRANSICIONES = {
+        'pendiente': ('pagado', 'cancelado'),
+        'pagado': ('enviado', 'cancelado'),
+        'enviado': ('entregado',),
+        'entregado': (),
+        'cancelado': (),
+    }
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='pedidos')
     fecha_pedido = models.DateTimeField(auto_now_add=True)
     estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
@@ -142,9 +236,20 @@ class Pedido(models.Model):
     metodo_pago = models.CharField(max_length=50, null=False, blank=False)
     total = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'fecha_pedido'])]
+
     def __str__(self):
         return f'Pedido {self.id} - {self.usuario.nombre} - {self.estado}'
 
+    @classmethod
+    def estados_origen(cls, destino):
+        """Estados desde los que se puede pasar a `destino`."""
+        return [origen for origen, destinos in cls.TRANSICIONES.items() if destino in destinos]
+
+    def puede_pasar_a(self, estado):
+        return estado in self.TRANSICIONES.get(self.estado, ())
+
 class DetallePedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='detalles')
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
@@ -153,3 +258,126 @@ class DetallePedido(models.Model):
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} en pedido {self.pedido.id}"
+
+class HistorialEstadoPedido(models.Model):
+    """Registro de solo inserción de los cambios de estado de los pedidos."""
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='historial')
+    estado_anterior = models.CharField(max_length=10, choices=Pedido.ESTADOS)
+    estado_nuevo = models.CharField(max_length=10, choices=Pedido.ESTADOS)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['fecha', 'id']
+
+    def __str__(self):
+        return f"Pedido {self.pedido_id}: {self.estado_anterior} -> {self.estado_nuevo}"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("El historial de estados no se puede modificar")
+        super().save(*args, **kwargs)
+
+class VentaDiaria(models.Model):
+    """Agregado diario de ventas por producto y estado del pedido, mantenido de forma incremental."""
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='ventas_diarias')
+    estado = models.CharField(max_length=10, choices=Pedido.ESTADOS)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pedidos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'estado'], name='venta_diaria_unica'),
+        ]
+        indexes = [models.Index(fields=['fecha', 'categoria'])]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id} - {self.estado}: {self.unidades} uds"
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano procesado por `manage.py run_worker`."""
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    nombre = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'ejecutar_despues'])]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.id} ({self.estado})"
+
+class CambioCatalogo(models.Model):
+    """Registro de cambios del catálogo; el id hace de número de versión del catálogo."""
+    TIPOS = [
+        ('guardado', 'Guardado'),
+        ('borrado', 'Borrado'),
+        ('referencias', 'Categorías y estancias'),
+    ]
+    # Sin clave foránea: el registro debe sobrevivir al borrado del producto. En los cambios
+    # de categorías y estancias ('referencias') vale 0
+    producto_id = models.BigIntegerField()
+    tipo = models.CharField(max_length=12, choices=TIPOS)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"v{self.id}: {self.tipo} {self.producto_id}"
+
+class ProductoRelacionado(models.Model):
+    """Vecinos precalculados de cada producto (manage.py calcular_relacionados)."""
+    TIPOS = [
+        ('compra', 'Comprados juntos'),
+        ('similar', 'Similares'),
+    ]
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='recomendado_en')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    puntuacion = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'tipo', 'relacionado'], name='producto_relacionado_unico'),
+        ]
+        indexes = [models.Index(fields=['producto', 'tipo', '-puntuacion'])]
+
+    def __str__(self):
+        return f"{self.producto_id} -> {self.relacionado_id} ({self.tipo}: {self.puntuacion:.3f})"
+
+class ClaveIdempotencia(models.Model):
+    """Respuesta guardada de un POST con cabecera Idempotency-Key, para repetirla en los reintentos."""
+    ESTADOS = [
+        ('en_curso', 'En curso'),
+        ('completada', 'Completada'),
+    ]
+    # Usuario autenticado: "usuario:<id>"
+    propietario = models.CharField(max_length=100)
+    clave = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='en_curso')
+    codigo = models.PositiveSmallIntegerField(null=True, blank=True)
+    respuesta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['propietario', 'clave'], name='clave_idempotencia_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.propietario} {self.clave} ({self.estado})"
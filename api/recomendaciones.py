@@ -0,0 +1,122 @@
+import json
+import math
+import random
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+from operator import itemgetter
+from django.db import transaction
+from .models import DetallePedido, Producto, ProductoRelacionado, Wishlist
+
+# Cestas más grandes apenas dicen nada de qué productos van juntos y disparan los pares
+MAX_PRODUCTOS_POR_CESTA = 50
+# Candidatos a similar por grupo de categoría/estancia para acotar el coste en catálogos grandes;
+# en grupos mayores se toma una muestra aleatoria para no favorecer a los productos más antiguos
+MAX_CANDIDATOS = 500
+
+
+def _contar_cestas(filas, conteos, frecuencias):
+    for _, grupo in groupby(filas, key=itemgetter(0)):
+        productos = sorted({producto_id for _, producto_id in grupo})[:MAX_PRODUCTOS_POR_CESTA]
+        frecuencias.update(productos)
+        for a, b in combinations(productos, 2):
+            conteos[a][b] += 1
+            conteos[b][a] += 1
+
+
+def comprados_juntos(top):
+    """
+    Vecinos por coocurrencia en pedidos y wishlists. Se recorre cada tabla una vez, ordenada
+    por cesta, y solo se guardan los pares que aparecen (conteo disperso). La puntuación es
+    la similitud coseno: coocurrencias / sqrt(frecuencia_a * frecuencia_b).
+    """
+    conteos = defaultdict(Counter)
+    frecuencias = Counter()
+    _contar_cestas(DetallePedido.objects.order_by('pedido_id')
+                   .values_list('pedido_id', 'producto_id').iterator(chunk_size=5000), conteos, frecuencias)
+    _contar_cestas(Wishlist.objects.order_by('usuario_id')
+                   .values_list('usuario_id', 'producto_id').iterator(chunk_size=5000), conteos, frecuencias)
+
+    for producto_id, vecinos in conteos.items():
+        puntuaciones = {
+            vecino: total / math.sqrt(frecuencias[producto_id] * frecuencias[vecino])
+            for vecino, total in vecinos.items()
+        }
+        for vecino, puntuacion in sorted(puntuaciones.items(), key=lambda item: (-item[1], item[0]))[:top]:
+            yield producto_id, vecino, puntuacion
+
+
+def _atributos(valor, clave):
+    """Normaliza colores/materiales en cualquiera de las formas aceptadas a un conjunto de textos."""
+    if isinstance(valor, str):
+        try:
+            valor = json.loads(valor)
+        except ValueError:
+            return {parte.strip().lower() for parte in valor.split(',') if parte.strip()}
+    if isinstance(valor, dict):
+        valor = list(valor.values())
+    if not isinstance(valor, list):
+        return {str(valor).lower()} if valor else set()
+    return {
+        str(item[clave] if isinstance(item, dict) and clave in item else item).strip().lower()
+        for item in valor
+    }
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _muestra(rng, grupo):
+    return grupo if len(grupo) <= MAX_CANDIDATOS else rng.sample(grupo, MAX_CANDIDATOS)
+
+
+def similares(top, semilla=0):
+    """
+    Vecinos por atributos: misma categoría (2), misma estancia (1) y coincidencia de
+    colores y materiales (índice de Jaccard, hasta 1 cada uno). La muestra de candidatos
+    depende de `semilla`, así que el resultado es reproducible.
+    """
+    rng = random.Random(semilla)
+    productos = {}
+    grupos = defaultdict(list)
+    for pk, categoria_id, estancia_id, colores, materiales in (
+        Producto.objects.order_by('pk')
+        .values_list('pk', 'categoria_id', 'estancia_id', 'colores', 'materiales').iterator(chunk_size=5000)
+    ):
+        productos[pk] = (categoria_id, estancia_id, _atributos(colores, 'color'), _atributos(materiales, 'material'))
+        grupos['c', categoria_id].append(pk)
+        if estancia_id is not None:
+            grupos['e', estancia_id].append(pk)
+
+    for pk, (categoria_id, estancia_id, colores, materiales) in productos.items():
+        candidatos = set(_muestra(rng, grupos['c', categoria_id]))
+        if estancia_id is not None:
+            candidatos.update(_muestra(rng, grupos['e', estancia_id]))
+        candidatos.discard(pk)
+
+        puntuaciones = []
+        for otro in candidatos:
+            otra_categoria, otra_estancia, otros_colores, otros_materiales = productos[otro]
+            puntuacion = (
+                2.0 * (otra_categoria == categoria_id)
+                + 1.0 * (estancia_id is not None and otra_estancia == estancia_id)
+                + _jaccard(colores, otros_colores)
+                + _jaccard(materiales, otros_materiales)
+            )
+            puntuaciones.append((-puntuacion, otro))
+        for negativa, otro in sorted(puntuaciones)[:top]:
+            yield pk, otro, -negativa
+
+
+def guardar_relacionados(tipo, vecinos):
+    """
+    Sustituye de una vez los vecinos de un tipo. Devuelve cuántas filas se guardaron.
+    El cálculo se termina antes de abrir la transacción: en SQLite el cerrojo de escritura
+    bloquea al resto de escrituras mientras dura.
+    """
+    filas = [ProductoRelacionado(producto_id=producto_id, relacionado_id=vecino, tipo=tipo, puntuacion=puntuacion)
+             for producto_id, vecino, puntuacion in vecinos]
+    with transaction.atomic():
+        ProductoRelacionado.objects.filter(tipo=tipo).delete()
+        ProductoRelacionado.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
@@ -0,0 +1,242 @@
+"""
+Generador determinista de datos de prueba a escala (manage.py seed).
+
+Cada tabla se reparte en bloques de FILAS_POR_BLOQUE filas con ids explícitos y cada bloque
+usa su propio generador aleatorio derivado de la semilla, así que el resultado es el mismo
+con un proceso o con varios: los procesos solo se reparten los bloques.
+"""
+import random
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .catalogo import registrar_cambios
+from .models import (Usuario, Categoria, Estancia, Producto, Wishlist, Carrito, ItemCarrito, Pedido,
+                     DetallePedido)
+
+FILAS_POR_BLOQUE = 10_000
+CONTRASEÑA = 'compactlifes'
+
+# Filas por unidad de --escala
+PROPORCIONES = {
+    'usuarios': 1000,
+    'productos': 200,
+    'carritos': 300,
+    'pedidos': 2000,
+}
+
+CATEGORIAS = ['Sofás', 'Mesas', 'Sillas', 'Camas', 'Armarios', 'Estanterías', 'Iluminación', 'Alfombras',
+              'Textil', 'Decoración', 'Almacenaje', 'Escritorios', 'Cómodas', 'Colchones', 'Espejos',
+              'Plantas', 'Cocina', 'Baño', 'Exterior', 'Infantil']
+ESTANCIAS = ['Salón', 'Dormitorio', 'Cocina', 'Baño', 'Oficina', 'Terraza', 'Recibidor', 'Habitación infantil']
+COLORES = ['Blanco', 'Negro', 'Gris', 'Beige', 'Roble', 'Nogal', 'Azul', 'Verde', 'Terracota', 'Mostaza']
+MATERIALES = ['Madera', 'Metal', 'Vidrio', 'Algodón', 'Lino', 'Ratán', 'Mármol', 'Poliéster', 'Cuero', 'Bambú']
+TIPOS_PRODUCTO = ['Sofá', 'Mesa', 'Silla', 'Cama', 'Armario', 'Estantería', 'Lámpara', 'Alfombra', 'Cómoda',
+                  'Escritorio', 'Espejo', 'Taburete', 'Aparador', 'Banco']
+ADJETIVOS = ['Nórdico', 'Compacto', 'Plegable', 'Modular', 'Clásico', 'Industrial', 'Minimal', 'Extensible']
+NOMBRES = ['Lucía', 'Hugo', 'Martina', 'Mateo', 'Sofía', 'Leo', 'Julia', 'Daniel', 'Paula', 'Álvaro']
+APELLIDOS = ['García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez']
+CALLES = ['Calle Mayor', 'Avenida de la Paz', 'Calle del Sol', 'Paseo del Prado', 'Calle Real']
+METODOS_PAGO = ['tarjeta', 'paypal', 'transferencia', 'bizum']
+ESTADOS_PEDIDO = ['pendiente', 'pagado', 'enviado', 'entregado', 'cancelado']
+PESOS_ESTADOS = [5, 10, 15, 65, 5]
+
+
+def plan(semilla, escala, dias):
+    """
+    Cantidades e ids iniciales de cada tabla. Los ids empiezan tras los existentes para poder
+    sembrar sobre una base de datos con datos.
+    """
+    def siguiente(modelo):
+        return (modelo.objects.aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+
+    return {
+        'semilla': semilla,
+        'dias': dias,
+        'contraseña': make_password(CONTRASEÑA),
+        # Las fechas de los pedidos cuentan hacia atrás desde hoy a medianoche
+        'ahora': timezone.now().replace(hour=0, minute=0, second=0, microsecond=0),
+        'usuarios': (siguiente(Usuario), max(int(PROPORCIONES['usuarios'] * escala), 1)),
+        'productos': (siguiente(Producto), max(int(PROPORCIONES['productos'] * escala), 1)),
+        'carritos': (siguiente(Carrito), int(PROPORCIONES['carritos'] * escala)),
+        'pedidos': (siguiente(Pedido), int(PROPORCIONES['pedidos'] * escala)),
+    }
+
+
+# Tablas que no tienen ids propios en el plan y se reparten según los de otra
+REPARTO = {'wishlists': 'usuarios'}
+
+
+def bloques(plan, tabla):
+    """Índices de bloque de una tabla."""
+    return range(-(-plan[REPARTO.get(tabla, tabla)][1] // FILAS_POR_BLOQUE))
+
+
+def _rng(plan, tabla, bloque):
+    return random.Random(f"{plan['semilla']}:{tabla}:{bloque}")
+
+
+def _ids(plan, tabla, bloque):
+    inicio, total = plan[REPARTO.get(tabla, tabla)]
+    desde = bloque * FILAS_POR_BLOQUE
+    return range(inicio + desde, inicio + min(desde + FILAS_POR_BLOQUE, total))
+
+
+def precio(plan, producto_id):
+    """Precio de un producto calculable sin consultarlo (los pedidos se generan en otros procesos)."""
+    return Decimal(zlib.crc32(f"{plan['semilla']}:precio:{producto_id}".encode()) % 150_000) / 100 + 20
+
+
+def crear_referencias(plan):
+    """
+    Categorías y estancias: pocas filas, se crean (si no existen ya) antes de repartir el resto.
+    """
+    with transaction.atomic():
+        plan['categorias'] = [
+            Categoria.objects.get_or_create(nombre=nombre, defaults={'descripcion': f'Productos de {nombre.lower()}'})[0].pk
+            for nombre in CATEGORIAS
+        ]
+        plan['estancias'] = [
+            Estancia.objects.get_or_create(nombre=nombre, defaults={'descripcion': f'Muebles para {nombre.lower()}'})[0].pk
+            for nombre in ESTANCIAS
+        ]
+
+
+def _atributos(rng, valores, clave):
+    """Colores/materiales en las tres formas que aceptan los serializers."""
+    elegidos = rng.sample(valores, rng.randint(1, 3))
+    forma = rng.randrange(3)
+    if forma == 0:
+        return elegidos
+    if forma == 1:
+        return [{clave: valor} for valor in elegidos]
+    return dict(zip(('principal', 'secundario', 'detalle'), elegidos))
+
+
+def _usuarios(plan, rng, ids):
+    for pk in ids:
+        yield Usuario(
+            pk=pk,
+            nombre=rng.choice(NOMBRES),
+            apellido=rng.choice(APELLIDOS),
+            email=f'usuario{pk}@seed.compactlifes.test',
+            contraseña=plan['contraseña'],
+            direccion=f'{rng.choice(CALLES)} {rng.randint(1, 200)}, {rng.randint(10000, 52999)}',
+            telefono=str(rng.randint(600_000_000, 799_999_999)),
+        )
+
+
+def _productos(plan, rng, ids):
+    for pk in ids:
+        categoria = rng.choice(plan['categorias'])
+        yield Producto(
+            pk=pk,
+            nombre=f'{rng.choice(TIPOS_PRODUCTO)} {rng.choice(ADJETIVOS)} {pk}',
+            descripcion=f'Producto de prueba {pk} generado con la semilla {plan["semilla"]}.',
+            precio=precio(plan, pk),
+            descuento=rng.choice((0, 0, 0, 5, 10, 15, 20, 30)),
+            existencias=rng.choice((0, rng.randint(1, 50))),
+            categoria_id=categoria,
+            estancia_id=rng.choice(plan['estancias'] + [None]),
+            imagen=f'https://picsum.photos/seed/compactlifes-{pk}/800/600',
+            colores=_atributos(rng, COLORES, 'color'),
+            materiales=_atributos(rng, MATERIALES, 'material'),
+            peso=round(rng.uniform(0.5, 80), 2),
+        )
+
+
+def _wishlists(plan, rng, ids):
+    producto_inicio, productos = plan['productos']
+    for usuario_id in ids:
+        for desplazamiento in rng.sample(range(productos), min(rng.choice((0, 0, 1, 2, 4, 8)), productos)):
+            yield Wishlist(usuario_id=usuario_id, producto_id=producto_inicio + desplazamiento)
+
+
+def _usuario_y_producto(plan, rng):
+    usuario_inicio, usuarios = plan['usuarios']
+    producto_inicio, productos = plan['productos']
+    return usuario_inicio + rng.randrange(usuarios), lambda: producto_inicio + rng.randrange(productos)
+
+
+def _carritos(plan, rng, ids, items):
+    for pk in ids:
+        usuario_id, producto = _usuario_y_producto(plan, rng)
+        for _ in range(rng.randint(1, 5)):
+            producto_id, cantidad = producto(), rng.randint(1, 3)
+            items.append(ItemCarrito(carrito_id=pk, producto_id=producto_id, cantidad=cantidad,
+                                     precio_total=precio(plan, producto_id) * cantidad))
+        yield Carrito(pk=pk, usuario_id=usuario_id)
+
+
+def _pedidos(plan, rng, ids, detalles):
+    segundos = plan['dias'] * 86400
+    for pk in ids:
+        usuario_id, producto = _usuario_y_producto(plan, rng)
+        total = Decimal('0')
+        for _ in range(rng.randint(1, 6)):
+            producto_id, cantidad = producto(), rng.randint(1, 4)
+            importe = precio(plan, producto_id) * cantidad
+            total += importe
+            detalles.append(DetallePedido(pedido_id=pk, producto_id=producto_id, cantidad=cantidad,
+                                          precio_total=importe))
+        yield Pedido(
+            pk=pk,
+            usuario_id=usuario_id,
+            fecha_pedido=plan['ahora'] - timedelta(seconds=rng.randrange(segundos)),
+            estado=rng.choices(ESTADOS_PEDIDO, PESOS_ESTADOS)[0],
+            direccion_envio=f'{rng.choice(CALLES)} {rng.randint(1, 200)}',
+            metodo_pago=rng.choice(METODOS_PAGO),
+            total=total,
+        )
+
+
+def _insertar(modelo, filas, batch_size):
+    """bulk_create por lotes consumiendo el generador, sin materializar el bloque entero."""
+    creadas = 0
+    while lote := list(islice(filas, batch_size)):
+        modelo.objects.bulk_create(lote, batch_size=batch_size)
+        creadas += len(lote)
+    return creadas
+
+
+def generar_bloque(plan, tabla, bloque, batch_size):
+    """Genera e inserta un bloque de una tabla en una transacción. Devuelve las filas creadas."""
+    rng = _rng(plan, tabla, bloque)
+    ids = _ids(plan, tabla, bloque)
+    with transaction.atomic():
+        if tabla == 'usuarios':
+            return _insertar(Usuario, _usuarios(plan, rng, ids), batch_size)
+        if tabla == 'productos':
+            creadas = _insertar(Producto, _productos(plan, rng, ids), batch_size)
+            registrar_cambios(ids)
+            return creadas
+        if tabla == 'wishlists':
+            return _insertar(Wishlist, _wishlists(plan, rng, ids), batch_size)
+        if tabla == 'carritos':
+            items = []
+            creadas = _insertar(Carrito, _carritos(plan, rng, ids, items), batch_size)
+            return creadas + _insertar(ItemCarrito, iter(items), batch_size)
+        if tabla == 'pedidos':
+            detalles = []
+            # fecha_pedido es auto_now_add: se desactiva para conservar las fechas repartidas
+            campo = Pedido._meta.get_field('fecha_pedido')
+            campo.auto_now_add = False
+            try:
+                creadas = _insertar(Pedido, _pedidos(plan, rng, ids, detalles), batch_size)
+            finally:
+                campo.auto_now_add = True
+            return creadas + _insertar(DetallePedido, iter(detalles), batch_size)
+    raise ValueError(f'Tabla desconocida: {tabla}')
+
+
+def reiniciar_secuencias():
+    """Tras insertar ids explícitos las secuencias de PostgreSQL quedan atrás; en SQLite no hace nada."""
+    sentencias = connection.ops.sequence_reset_sql(no_style(), [Usuario, Producto, Carrito, Pedido])
+    with connection.cursor() as cursor:
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
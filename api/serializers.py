@@ -1,7 +1,10 @@
 from rest_framework import serializers
-from .models import Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido, Estancia
+from .models import (Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido,
+                     Estancia, VentaDiaria, HistorialEstadoPedido)
 from decimal import Decimal
 from django.contrib.auth.hashers import make_password
+from .imagenes import url_variante, validar_url_imagen, ImagenNoValida
+from .auth import registrar, actualizar
 
 class UsuarioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,16 +20,18 @@ class RegistroSerializer(serializers.ModelSerializer):
         fields = ['nombre', 'apellido', 'email', 'contraseña', 'confirmar_contraseña', 'direccion', 'telefono']
         extra_kwargs = {
             'contraseña': {'write_only': True},
+            # La unicidad la comprueba el INSERT (api.auth.registrar), sin consulta previa
+            'email': {'validators': []},
         }
     
     def validate(self, data):
         if data.get('contraseña') != data.pop('confirmar_contraseña'):
             raise serializers.ValidationError({"error": "Las contraseñas no coinciden"})
+        data['contraseña'] = make_password(data['contraseña'])
         return data
     
     def create(self, validated_data):
-        usuario = Usuario.objects.create(**validated_data)
-        return usuario
+        return registrar(validated_data)
 
 class ActualizarUsuarioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,12 +39,7 @@ class ActualizarUsuarioSerializer(serializers.ModelSerializer):
         fields = ['nombre', 'apellido', 'direccion', 'telefono']
         
     def update(self, instance, validated_data):
-        instance.nombre = validated_data.get('nombre', instance.nombre)
-        instance.apellido = validated_data.get('apellido', instance.apellido)
-        instance.direccion = validated_data.get('direccion', instance.direccion)
-        instance.telefono = validated_data.get('telefono', instance.telefono)
-        instance.save()
-        return instance
+        return actualizar(instance, validated_data)
 
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
@@ -56,8 +56,10 @@ class EstanciaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class ProductoSerializer(serializers.ModelSerializer):
+    descuento_efectivo = serializers.SerializerMethodField()
     precio_con_descuento = serializers.SerializerMethodField()
     imagen_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
     categoria_nombre = serializers.ReadOnlyField(source='categoria.nombre')
     estancia_nombre = serializers.ReadOnlyField(source='estancia.nombre')
     categoria_data = CategoriaSerializer(source='categoria', read_only=True)
@@ -69,24 +71,57 @@ class ProductoSerializer(serializers.ModelSerializer):
         model = Producto
         fields = [
             'id', 'nombre', 'descripcion', 'precio', 'descuento', 
-            'precio_con_descuento', 'stock', 'categoria', 'categoria_nombre', 
-            'estancia', 'estancia_nombre', 'imagen', 'imagen_url', 
+            'descuento_efectivo', 'precio_con_descuento', 'existencias', 'stock', 'categoria', 'categoria_nombre', 
+            'estancia', 'estancia_nombre', 'imagen', 'imagen_url', 'srcset',
             'colores', 'materiales', 'peso', 'fecha_creacion',
             'categoria_data', 'estancia_data',
             'colores_formateados', 'materiales_formateados'
         ]
         extra_kwargs = {
             'imagen': {'required': True},
+            # Cambian con cada compra y las respuestas del catálogo se cachean: se leen de
+            # /api/productos/existencias/
+            'existencias': {'write_only': True},
         }
 
+    def validate_imagen(self, value):
+        """El worker descargará la imagen: se rechazan ya las URLs a direcciones no públicas."""
+        if self.instance is None or value != self.instance.imagen:
+            try:
+                validar_url_imagen(value)
+            except ImagenNoValida as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
+    def get_descuento_efectivo(self, obj):
+        return getattr(obj, 'descuento_efectivo', obj.descuento)
+
     def get_precio_con_descuento(self, obj):
-        return obj.precio * (Decimal('1') - Decimal(obj.descuento) / Decimal('100'))
+        return obj.precio * (Decimal('1') - Decimal(self.get_descuento_efectivo(obj)) / Decimal('100'))
 
     def get_imagen_url(self, obj):
+        """Devuelve la variante local más grande si la imagen ya está procesada, si no la URL original."""
+        jpeg = (obj.imagen_variantes or {}).get('jpeg')
+        if jpeg:
+            return url_variante(jpeg[max(jpeg, key=int)], self.context.get('request'))
         if obj.imagen:
             return obj.imagen
         return None
 
+    def get_srcset(self, obj):
+        """Valor `srcset` por formato (webp y jpeg) con las miniaturas generadas."""
+        variantes = obj.imagen_variantes or {}
+        if not variantes:
+            return None
+        request = self.context.get('request')
+        return {
+            formato: ", ".join(
+                f"{url_variante(nombre, request)} {ancho}w"
+                for ancho, nombre in sorted(por_ancho.items(), key=lambda item: int(item[0]))
+            )
+            for formato, por_ancho in variantes.items()
+        }
+
     def get_colores_formateados(self, obj):
         try:
             data = obj.colores
@@ -159,4 +194,69 @@ class PedidoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Pedido
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def validate_estado(self, value):
+        """Los pedidos nacen pendientes y solo admiten los cambios de Pedido.TRANSICIONES."""
+        if self.instance is None and value != 'pendiente':
+            raise serializers.ValidationError("Los pedidos se crean en estado 'pendiente'")
+        if self.instance and value != self.instance.estado and not self.instance.puede_pasar_a(value):
+            raise serializers.ValidationError(f"No se puede pasar de '{self.instance.estado}' a '{value}'")
+        return value
+
+class HistorialEstadoPedidoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HistorialEstadoPedido
+        fields = '__all__'
+
+class TransicionPedidosSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+    estado = serializers.ChoiceField(choices=Pedido.ESTADOS)
+
+    def validate_estado(self, value):
+        if not Pedido.estados_origen(value):
+            raise serializers.ValidationError(f"Ningún pedido puede pasar a '{value}'")
+        return value
+
+class ActualizacionMasivaProductosSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    categoria = serializers.IntegerField(required=False)
+    estancia = serializers.IntegerField(required=False)
+    precio = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    descuento = serializers.IntegerField(min_value=0, max_value=100, required=False)
+    existencias = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if not any(campo in data for campo in ('ids', 'categoria', 'estancia')):
+            raise serializers.ValidationError({"error": "Se requiere 'ids', 'categoria' o 'estancia' para seleccionar productos"})
+        if not any(campo in data for campo in ('precio', 'descuento', 'existencias')):
+            raise serializers.ValidationError({"error": "Se requiere al menos un cambio: 'precio', 'descuento' o 'existencias'"})
+        return data
+
+
+class VentaDiariaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VentaDiaria
+        fields = '__all__'
+
+
+class ImagenProductoSerializer(serializers.Serializer):
+    archivo = serializers.FileField(required=False)
+    url = serializers.URLField(max_length=500, required=False)
+
+    def validate_url(self, value):
+        try:
+            validar_url_imagen(value)
+        except ImagenNoValida as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate(self, data):
+        if bool(data.get('archivo')) == bool(data.get('url')):
+            raise serializers.ValidationError({"error": "Se requiere 'archivo' o 'url' (solo uno de ellos)"})
+        return data
+
+
+class CheckoutSerializer(serializers.Serializer):
+    direccion_envio = serializers.CharField()
+    metodo_pago = serializers.CharField(max_length=50)
@@ -0,0 +1,85 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import invalidar_catalogo
+from .catalogo import registrar_cambios, productos_de_promociones
+from .inventario import devolver_pedidos
+from .models import Producto, Promocion, Pedido, HistorialEstadoPedido
+from .ventas import programar_actualizacion, pares_de_pedidos
+
+CAMPOS_ACTUALIZACION_MASIVA = ('precio', 'descuento', 'existencias')
+
+
+def filtrar_productos(ids=None, categoria=None, estancia=None):
+    """Selecciona productos por ids y/o por categoría y estancia."""
+    queryset = Producto.objects.all()
+    if ids:
+        queryset = queryset.filter(pk__in=ids)
+    if categoria is not None:
+        queryset = queryset.filter(categoria_id=categoria)
+    if estancia is not None:
+        queryset = queryset.filter(estancia_id=estancia)
+    return queryset
+
+
+def actualizar_productos(queryset, cambios):
+    """
+    Aplica precio, descuento y/o existencias a todos los productos del queryset con un único UPDATE.
+
+    Solo se escriben las filas cuyo valor difiere del nuevo, de modo que el número
+    devuelto es el de filas realmente modificadas (y solo esas pasan al registro de cambios).
+    """
+    cambios = {campo: valor for campo, valor in cambios.items() if campo in CAMPOS_ACTUALIZACION_MASIVA}
+    if not cambios:
+        return 0
+
+    with transaction.atomic():
+        ids = list(queryset.exclude(Q(**cambios)).values_list('pk', flat=True))
+        if not ids:
+            return 0
+        actualizados = Producto.objects.filter(pk__in=ids).update(**cambios)
+        registrar_cambios(ids)
+        transaction.on_commit(invalidar_catalogo)
+    return actualizados
+
+
+def aplicar_ventanas_promociones(momento=None):
+    """
+    Activa las promociones cuya ventana ha empezado y expira las que han terminado,
+    con un UPDATE por transición. Devuelve (activadas, expiradas).
+    """
+    momento = momento or timezone.now()
+    with transaction.atomic():
+        por_activar = Promocion.objects.filter(estado='programada').vigentes(momento)
+        por_expirar = Promocion.objects.exclude(estado='expirada').filter(fecha_fin__lte=momento)
+        afectadas = list(por_activar.values_list('pk', flat=True)) + list(por_expirar.values_list('pk', flat=True))
+        activadas = Promocion.objects.filter(pk__in=por_activar.values('pk')).update(estado='activa')
+        expiradas = Promocion.objects.filter(pk__in=por_expirar.values('pk')).update(estado='expirada')
+        if afectadas:
+            registrar_cambios(productos_de_promociones(afectadas))
+            transaction.on_commit(invalidar_catalogo)
+    return activadas, expiradas
+
+
+def transicionar_pedidos(ids, destino):
+    """
+    Pasa a `destino` los pedidos indicados que estén en un estado de origen válido, con un
+    único UPDATE condicionado al estado, y deja constancia en el historial. Los pedidos
+    cancelados devuelven sus unidades al stock. Devuelve los ids movidos.
+    """
+    origenes = Pedido.estados_origen(destino)
+    with transaction.atomic():
+        anteriores = list(Pedido.objects.select_for_update()
+                          .filter(pk__in=ids, estado__in=origenes).values_list('pk', 'estado'))
+        if not anteriores:
+            return []
+        movidos = [pk for pk, _ in anteriores]
+        Pedido.objects.filter(pk__in=movidos, estado__in=origenes).update(estado=destino)
+        HistorialEstadoPedido.objects.bulk_create(
+            HistorialEstadoPedido(pedido_id=pk, estado_anterior=estado, estado_nuevo=destino)
+            for pk, estado in anteriores
+        )
+        if destino == 'cancelado':
+            devolver_pedidos(movidos)
+        programar_actualizacion(pares_de_pedidos(movidos))
+    return movidos
@@ -0,0 +1,118 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import invalidar_catalogo
+from .catalogo import registrar_cambios, registrar_referencias, productos_de_promociones
+from .inventario import devolver_pedidos
+from .models import Producto, Promocion, Pedido, DetallePedido, HistorialEstadoPedido, Categoria, Estancia, Servicio
+from .ventas import programar_actualizacion, pares_de_pedidos
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, **kwargs):
+    """Registra el cambio para la sincronización incremental e invalida la caché del catálogo."""
+    registrar_cambios([instance.pk])
+    invalidar_catalogo()
+
+
+@receiver(post_delete, sender=Producto)
+def producto_borrado(sender, instance, **kwargs):
+    registrar_cambios([instance.pk], tipo='borrado')
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Estancia)
+@receiver(post_delete, sender=Estancia)
+def referencias_modificadas(sender, instance, **kwargs):
+    """Los mapas de categorías y estancias del snapshot cambian: nueva versión del catálogo."""
+    registrar_referencias()
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def catalogo_modificado(sender, instance, **kwargs):
+    """Invalida las respuestas cacheadas de servicios."""
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=Promocion)
+@receiver(pre_delete, sender=Promocion)
+def promocion_modificada(sender, instance, **kwargs):
+    """Los productos de la promoción cambian de descuento efectivo."""
+    registrar_cambios(productos_de_promociones([instance.pk]))
+    invalidar_catalogo()
+
+
+def _productos_de_destinos(modelo, pks):
+    if modelo is Producto:
+        return set(pks)
+    campo = 'categoria' if modelo is Categoria else 'estancia'
+    return set(Producto.objects.filter(**{f'{campo}__in': pks}).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Promocion.productos.through)
+@receiver(m2m_changed, sender=Promocion.categorias.through)
+@receiver(m2m_changed, sender=Promocion.estancias.through)
+def destinos_promocion_modificados(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Registra los productos que entran o salen de una promoción."""
+    if action == 'pre_clear':
+        productos = (productos_de_promociones([instance.pk]) if not reverse
+                     else _productos_de_destinos(type(instance), [instance.pk]))
+    elif action in ('post_add', 'post_remove'):
+        productos = (_productos_de_destinos(model, pk_set) if not reverse
+                     else _productos_de_destinos(type(instance), [instance.pk]))
+    else:
+        return
+    registrar_cambios(productos)
+    invalidar_catalogo()
+
+
+@receiver(pre_save, sender=Pedido)
+def pedido_guardando(sender, instance, **kwargs):
+    """Recuerda el estado anterior para detectar cambios de estado tras guardar."""
+    instance._estado_anterior = None
+    if instance.pk:
+        instance._estado_anterior = Pedido.objects.filter(pk=instance.pk).values_list('estado', flat=True).first()
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_guardado(sender, instance, created, **kwargs):
+    """
+    Registra el cambio de estado, devuelve el stock si el pedido se cancela y mueve las
+    ventas del pedido al nuevo estado en el agregado diario.
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    if not created and anterior is not None and anterior != instance.estado:
+        HistorialEstadoPedido.objects.create(pedido=instance, estado_anterior=anterior, estado_nuevo=instance.estado)
+        if instance.estado == 'cancelado':
+            devolver_pedidos([instance.pk])
+        programar_actualizacion(pares_de_pedidos([instance.pk]))
+
+
+@receiver(pre_delete, sender=Pedido)
+def pedido_eliminando(sender, instance, **kwargs):
+    """Las líneas se borran en cascada: se recalculan sus pares cuando ya no existen."""
+    programar_actualizacion(pares_de_pedidos([instance.pk]))
+
+
+@receiver(pre_save, sender=DetallePedido)
+def detalle_guardando(sender, instance, **kwargs):
+    instance._producto_anterior = None
+    if instance.pk:
+        instance._producto_anterior = (DetallePedido.objects.filter(pk=instance.pk)
+                                       .values_list('producto_id', flat=True).first())
+
+
+@receiver(post_save, sender=DetallePedido)
+@receiver(post_delete, sender=DetallePedido)
+def detalle_modificado(sender, instance, **kwargs):
+    """Recalcula el agregado del día y producto de la línea modificada."""
+    fecha_pedido = Pedido.objects.filter(pk=instance.pedido_id).values_list('fecha_pedido', flat=True).first()
+    if fecha_pedido is None:
+        return
+    fecha = timezone.localdate(fecha_pedido)
+    productos = {instance.producto_id, getattr(instance, '_producto_anterior', None)} - {None}
+    programar_actualizacion((fecha, producto_id) for producto_id in productos)
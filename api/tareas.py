@@ -0,0 +1,139 @@
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F
+from django.utils import timezone
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+# SQLite no tiene SKIP LOCKED: los hilos de un mismo proceso reclaman de uno en uno
+_bloqueo_reclamo = threading.Lock()
+
+
+def tarea(nombre):
+    """Registra una función como tarea ejecutable por el worker."""
+    def decorador(funcion):
+        _registro[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(nombre, *args, retraso=None, max_intentos=None, **kwargs):
+    """
+    Crea la tarea dentro de la transacción en curso, de modo que solo llega al worker si
+    la transacción se confirma. Con TAREAS_SINCRONAS se ejecuta al confirmar, sin worker.
+    """
+    if settings.TAREAS_SINCRONAS:
+        transaction.on_commit(lambda: _registro[nombre](*args, **kwargs))
+        return None
+    return Tarea.objects.create(
+        nombre=nombre,
+        argumentos={'args': list(args), 'kwargs': kwargs},
+        ejecutar_despues=timezone.now() + (retraso or timedelta()),
+        max_intentos=max_intentos or settings.TAREAS_MAX_INTENTOS,
+    )
+
+
+def _marcar_en_curso(queryset, worker, ahora):
+    return queryset.update(estado='en_curso', worker=worker, fecha_inicio=ahora, intentos=F('intentos') + 1)
+
+
+def reclamar_tareas(worker, limite=1):
+    """
+    Reserva hasta `limite` tareas pendientes para este worker. En PostgreSQL usa
+    SELECT ... FOR UPDATE SKIP LOCKED; en SQLite, un bloqueo entre hilos y un UPDATE
+    condicionado al estado.
+    """
+    ahora = timezone.now()
+    disponibles = Tarea.objects.filter(estado='pendiente', ejecutar_despues__lte=ahora).order_by('ejecutar_despues')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(disponibles.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limite])
+            _marcar_en_curso(Tarea.objects.filter(pk__in=ids), worker, ahora)
+    else:
+        # Un único UPDATE con subconsulta: la escritura toma el bloqueo de SQLite desde el
+        # principio, sin lectura previa que haya que promocionar a escritura
+        with _bloqueo_reclamo:
+            _marcar_en_curso(
+                Tarea.objects.filter(pk__in=disponibles.values('pk')[:limite], estado='pendiente'),
+                worker, ahora,
+            )
+            ids = Tarea.objects.filter(estado='en_curso', worker=worker, fecha_inicio=ahora).values('pk')
+    return list(Tarea.objects.filter(pk__in=ids).order_by('ejecutar_despues'))
+
+
+def espera_reintento(intentos):
+    """Backoff exponencial con algo de aleatoriedad para no reintentar todas a la vez."""
+    segundos = settings.TAREAS_BACKOFF_BASE * (2 ** (intentos - 1))
+    return timedelta(seconds=segundos * random.uniform(0.8, 1.2))
+
+
+def ejecutar_tarea(tarea):
+    """Ejecuta una tarea reclamada y registra el resultado o programa el reintento."""
+    try:
+        funcion = _registro.get(tarea.nombre)
+        if funcion is None:
+            raise LookupError(f"Tarea no registrada: {tarea.nombre}")
+        funcion(*tarea.argumentos.get('args', []), **tarea.argumentos.get('kwargs', {}))
+    except Exception:
+        tarea.error = traceback.format_exc()
+        if tarea.intentos >= tarea.max_intentos:
+            tarea.estado = 'fallida'
+            tarea.fecha_fin = timezone.now()
+            logger.error('Tarea %s fallida definitivamente', tarea)
+        else:
+            tarea.estado = 'pendiente'
+            tarea.ejecutar_despues = timezone.now() + espera_reintento(tarea.intentos)
+            logger.warning('Tarea %s fallida, reintento %s', tarea, tarea.intentos)
+        tarea.save(update_fields=['estado', 'error', 'fecha_fin', 'ejecutar_despues'])
+        return False
+
+    tarea.estado = 'completada'
+    tarea.fecha_fin = timezone.now()
+    tarea.save(update_fields=['estado', 'fecha_fin'])
+    return True
+
+
+def recuperar_bloqueadas():
+    """
+    Devuelve a la cola las tareas de workers que murieron a mitad de ejecución. Las que ya
+    agotaron sus intentos quedan fallidas: una tarea que tumba al worker no se repite sin fin.
+    Devuelve cuántas volvieron a la cola.
+    """
+    ahora = timezone.now()
+    bloqueadas = Tarea.objects.filter(estado='en_curso', fecha_inicio__lt=ahora - timedelta(
+        seconds=settings.TAREAS_TIEMPO_MAXIMO))
+    with transaction.atomic():
+        fallidas = bloqueadas.filter(intentos__gte=F('max_intentos')).update(
+            estado='fallida', fecha_fin=ahora, error='El worker dejó de responder en el último intento',
+        )
+        devueltas = bloqueadas.update(estado='pendiente')
+    if fallidas:
+        logger.error('%s tareas bloqueadas fallidas definitivamente', fallidas)
+    return devueltas
+
+
+def purgar_tareas(dias):
+    """Elimina las tareas completadas hace más de `dias` días."""
+    limite = timezone.now() - timedelta(days=dias)
+    borradas, _ = Tarea.objects.filter(estado='completada', fecha_fin__lt=limite).delete()
+    return borradas
+
+
+def metricas():
+    """Número de tareas por estado y duración media de las completadas por tipo."""
+    duracion = ExpressionWrapper(F('fecha_fin') - F('fecha_inicio'), output_field=DurationField())
+    return {
+        'por_estado': dict(Tarea.objects.order_by().values_list('estado').annotate(total=Count('pk'))),
+        'por_tarea': list(
+            Tarea.objects.filter(estado='completada').order_by().values('nombre')
+            .annotate(total=Count('pk'), duracion_media=Avg(duracion))
+            .order_by('nombre')
+        ),
+    }
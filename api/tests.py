@@ -1,3 +1,568 @@
-from django.test import TestCase
+import tempfile
+import threading
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from datetime import timedelta
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from compactlifes.routers import LecturaRouter, escribio_hace_poco, marcar_escritura, usar_lectura
+from .cache import invalidar_catalogo, version_catalogo
+from .imagenes import ImagenNoValida, descargar_imagen, validar_url_imagen
+from .views import PedidoViewSet
+from .services import transicionar_pedidos
+from .ventas import reconstruir_ventas
+from .tareas import tarea, encolar, reclamar_tareas, ejecutar_tarea, recuperar_bloqueadas
+from .recomendaciones import similares, guardar_relacionados
+from .inventario import StockInsuficiente, reservar, liberar_reservas, expirar_reservas, checkout
+from .models import Categoria, DetallePedido, Estancia, Promocion, Producto, VentaDiaria, ProductoRelacionado, Tarea, Usuario, Carrito, ItemCarrito, Pedido, ReservaStock, ClaveIdempotencia
 
-# Create your tests here.
+
+def crear_producto(existencias):
+    categoria = Categoria.objects.create(nombre='Sofás', descripcion='Sofás')
+    return Producto.objects.create(
+        nombre='Sofá', descripcion='Sofá de prueba', precio=100, peso=30, categoria=categoria,
+        imagen='https://example.com/sofa.jpg', existencias=existencias,
+    )
+
+
+def crear_usuario():
+    return Usuario.objects.create(nombre='Ana', apellido='López', email='ana@example.com', contraseña='secreta',
+                                  direccion='Calle Mayor 1', telefono='600000000')
+
+
+class InventarioTests(TestCase):
+    def setUp(self):
+        self.producto = crear_producto(existencias=5)
+
+    def existencias(self):
+        self.producto.refresh_from_db()
+        return self.producto.existencias
+
+    def test_reservar_descuenta_existencias(self):
+        reserva = reservar(self.producto.pk, 3)
+        self.assertEqual(reserva.cantidad, 3)
+        self.assertEqual(self.existencias(), 2)
+        self.assertTrue(self.producto.stock)
+
+    def test_reservar_sin_existencias_no_descuenta(self):
+        with self.assertRaises(StockInsuficiente):
+            reservar(self.producto.pk, 6)
+        self.assertEqual(self.existencias(), 5)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_liberar_devuelve_unidades(self):
+        reservar(self.producto.pk, 2)
+        reservar(self.producto.pk, 3)
+        self.assertEqual(self.existencias(), 0)
+        self.assertEqual(liberar_reservas(ReservaStock.objects.all()), 2)
+        self.assertEqual(self.existencias(), 5)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_expirar_solo_libera_caducadas(self):
+        caducada = reservar(self.producto.pk, 2)
+        reservar(self.producto.pk, 1)
+        ReservaStock.objects.filter(pk=caducada.pk).update(expira=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expirar_reservas(), 1)
+        self.assertEqual(self.existencias(), 4)
+        self.assertEqual(ReservaStock.objects.count(), 1)
+
+    def test_cancelar_pedido_devuelve_unidades(self):
+        carrito = Carrito.objects.create(usuario=crear_usuario())
+        item = ItemCarrito.objects.create(carrito=carrito, producto=self.producto, cantidad=5, precio_total=500)
+        reservar(self.producto.pk, 5, item)
+        pedido = checkout(carrito, direccion_envio='Calle Mayor 1', metodo_pago='tarjeta')
+        self.assertEqual(self.existencias(), 0)
+
+        respuesta = APIClient(SERVER_NAME='localhost').post(
+            '/api/pedidos/transicion/', {'ids': [pedido.pk], 'estado': 'cancelado'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.existencias(), 5)
+
+    def test_detalle_directo_descuenta_existencias(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        pedido = Pedido.objects.create(usuario=crear_usuario(), direccion_envio='Calle Mayor 1',
+                                       metodo_pago='tarjeta', total=500)
+        datos = {'pedido': pedido.pk, 'producto': self.producto.pk, 'cantidad': 4, 'precio_total': '400.00'}
+        self.assertEqual(cliente.post('/api/detalles-pedido/', datos, format='json').status_code, 201)
+        self.assertEqual(self.existencias(), 1)
+        self.assertEqual(cliente.post('/api/detalles-pedido/', datos, format='json').status_code, 409)
+        self.assertEqual(self.existencias(), 1)
+
+
+class PedidoTests(TestCase):
+    def test_pedido_nuevo_solo_pendiente(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        datos = {'usuario': crear_usuario().pk, 'direccion_envio': 'Calle Mayor 1', 'metodo_pago': 'tarjeta',
+                 'total': '10.00', 'estado': 'entregado'}
+        self.assertEqual(cliente.post('/api/pedidos/', datos, format='json').status_code, 400)
+        del datos['estado']
+        respuesta = cliente.post('/api/pedidos/', datos, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['estado'], 'pendiente')
+
+    def test_transicion_se_comprueba_con_el_pedido_bloqueado(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        pedido = Pedido.objects.create(usuario=crear_usuario(), direccion_envio='Calle Mayor 1',
+                                       metodo_pago='tarjeta', total=10)
+        # Otra petición cancela el pedido después de que esta lo haya leído
+        Pedido.objects.filter(pk=pedido.pk).update(estado='cancelado')
+        with mock.patch.object(PedidoViewSet, 'get_object', return_value=pedido):
+            respuesta = cliente.patch(f'/api/pedidos/{pedido.pk}/', {'estado': 'pagado'}, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+            pedido.estado = 'pendiente'
+            respuesta = cliente.patch(f'/api/pedidos/{pedido.pk}/', {'direccion_envio': 'Calle Real 2'},
+                                      format='json')
+            self.assertEqual(respuesta.status_code, 200)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.estado, 'cancelado')
+        self.assertEqual(pedido.direccion_envio, 'Calle Real 2')
+
+
+def crear_promocion(descuento, inicio, fin, **destinos):
+    promocion = Promocion.objects.create(nombre=f'Promoción {descuento}', descuento=descuento,
+                                         fecha_inicio=inicio, fecha_fin=fin)
+    for campo, objetos in destinos.items():
+        getattr(promocion, campo).set(objetos)
+    return promocion
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PromocionesTests(TestCase):
+    def setUp(self):
+        self.ahora = timezone.now()
+        self.producto = crear_producto(existencias=1)
+        self.producto.estancia = Estancia.objects.create(nombre='Salón')
+        self.producto.descuento = 5
+        self.producto.save()
+        self.otro = Producto.objects.create(nombre='Mesa', descripcion='Mesa', precio=50, peso=10,
+                                            categoria=Categoria.objects.create(nombre='Mesas', descripcion='Mesas'),
+                                            imagen='https://example.com/mesa.jpg')
+
+    def descuento_efectivo(self, producto):
+        return Producto.objects.con_descuento_efectivo().get(pk=producto.pk).descuento_efectivo
+
+    def test_descuento_efectivo_es_el_mayor_vigente(self):
+        hora = timedelta(hours=1)
+        self.assertEqual(self.descuento_efectivo(self.producto), 5)
+        crear_promocion(10, self.ahora - hora, self.ahora + hora, productos=[self.producto])
+        crear_promocion(20, self.ahora - hora, self.ahora + hora, categorias=[self.producto.categoria])
+        crear_promocion(15, self.ahora - hora, self.ahora + hora, estancias=[self.producto.estancia])
+        # Ventanas que aún no empiezan o ya terminaron no cuentan
+        crear_promocion(50, self.ahora + hora, self.ahora + 2 * hora, productos=[self.producto])
+        crear_promocion(60, self.ahora - 2 * hora, self.ahora - hora, categorias=[self.producto.categoria])
+        self.assertEqual(self.descuento_efectivo(self.producto), 20)
+        self.assertEqual(self.descuento_efectivo(self.otro), 0)
+
+    def test_ofertas_y_sin_ofertas(self):
+        self.producto.descuento = 0
+        self.producto.save()
+        crear_promocion(30, self.ahora - timedelta(hours=1), self.ahora + timedelta(hours=1),
+                        estancias=[self.producto.estancia])
+        cliente = APIClient(SERVER_NAME='localhost')
+        ofertas = cliente.get('/api/productos/ofertas/').json()
+        self.assertEqual([(p['id'], p['descuento_efectivo']) for p in ofertas], [(self.producto.pk, 30)])
+        self.assertEqual([p['id'] for p in cliente.get('/api/productos/sin-ofertas/').json()], [self.otro.pk])
+
+    def test_comando_activa_y_expira(self):
+        hora = timedelta(hours=1)
+        empezada = crear_promocion(10, self.ahora - hora, self.ahora + hora)
+        terminada = crear_promocion(10, self.ahora - 2 * hora, self.ahora - hora)
+        Promocion.objects.filter(pk=terminada.pk).update(estado='activa')
+        futura = crear_promocion(10, self.ahora + hora, self.ahora + 2 * hora)
+        salida = StringIO()
+        call_command('aplicar_promociones', stdout=salida)
+        self.assertIn('1 promociones activadas, 1 expiradas', salida.getvalue())
+        estados = dict(Promocion.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados, {empezada.pk: 'activa', terminada.pk: 'expirada', futura.pk: 'programada'})
+        call_command('aplicar_promociones', stdout=salida)
+        self.assertIn('0 promociones activadas, 0 expiradas', salida.getvalue())
+
+
+@override_settings(TAREAS_SINCRONAS=True)
+class VentasTests(TestCase):
+    def setUp(self):
+        self.sofa = crear_producto(existencias=10)
+        self.mesa = Producto.objects.create(nombre='Mesa', descripcion='Mesa', precio=50, peso=10,
+                                            categoria=self.sofa.categoria, imagen='https://example.com/mesa.jpg')
+        usuario = crear_usuario()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.primero = self.crear_pedido(usuario, [(self.sofa, 2, 200), (self.mesa, 1, 50)])
+            self.segundo = self.crear_pedido(usuario, [(self.sofa, 1, 100)])
+
+    def crear_pedido(self, usuario, lineas):
+        pedido = Pedido.objects.create(usuario=usuario, direccion_envio='Calle Mayor 1', metodo_pago='tarjeta',
+                                       total=sum(importe for _, _, importe in lineas))
+        for producto, cantidad, importe in lineas:
+            DetallePedido.objects.create(pedido=pedido, producto=producto, cantidad=cantidad, precio_total=importe)
+        return pedido
+
+    def ventas(self):
+        return {
+            (producto_id, estado): (unidades, int(ingresos), pedidos)
+            for producto_id, estado, unidades, ingresos, pedidos in VentaDiaria.objects.values_list(
+                'producto_id', 'estado', 'unidades', 'ingresos', 'pedidos')
+        }
+
+    def resumen(self, agrupar):
+        return APIClient(SERVER_NAME='localhost').get('/api/ventas/resumen/', {'agrupar': agrupar}).json()
+
+    def test_agregado_sigue_a_los_pedidos(self):
+        self.assertEqual(self.ventas(), {
+            (self.sofa.pk, 'pendiente'): (3, 300, 2),
+            (self.mesa.pk, 'pendiente'): (1, 50, 1),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transicionar_pedidos([self.segundo.pk], 'pagado')
+        with self.captureOnCommitCallbacks(execute=True):
+            linea = self.primero.detalles.get(producto=self.mesa)
+            linea.cantidad, linea.precio_total = 3, 150
+            linea.save()
+        self.assertEqual(self.ventas(), {
+            (self.sofa.pk, 'pendiente'): (2, 200, 1),
+            (self.sofa.pk, 'pagado'): (1, 100, 1),
+            (self.mesa.pk, 'pendiente'): (3, 150, 1),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.primero.detalles.get(producto=self.mesa).delete()
+        self.assertNotIn((self.mesa.pk, 'pendiente'), self.ventas())
+
+    def test_reconstruir_da_el_mismo_agregado(self):
+        esperado = self.ventas()
+        VentaDiaria.objects.all().delete()
+        hoy = timezone.localdate()
+        self.assertEqual(reconstruir_ventas(hoy - timedelta(days=3), hoy, dias_por_bloque=2), len(esperado))
+        self.assertEqual(self.ventas(), esperado)
+
+    def test_resumen_no_cuenta_pedidos_dos_veces(self):
+        por_dia = self.resumen('dia')
+        self.assertEqual(por_dia, [{'dia': timezone.localdate().isoformat(), 'unidades': 4, 'ingresos': '350.00'}])
+        por_producto = {fila['producto']: fila for fila in self.resumen('producto')}
+        self.assertEqual(por_producto[self.sofa.pk]['pedidos'], 2)
+        self.assertEqual(por_producto[self.mesa.pk]['pedidos'], 1)
+        self.assertEqual(por_producto[self.sofa.pk]['ingresos'], '300.00')
+
+
+class CatalogoTests(TestCase):
+    def test_cambio_de_categoria_crea_version(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        categoria = crear_producto(existencias=1).categoria
+        etag = cliente.get('/api/catalogo/snapshot/')['ETag']
+        version = cliente.get('/api/catalogo/cambios/', {'desde': 0}).json()['version']
+
+        categoria.nombre = 'Sillones'
+        categoria.save()
+        self.assertNotEqual(cliente.get('/api/catalogo/snapshot/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        cambios = cliente.get('/api/catalogo/cambios/', {'desde': version}).json()
+        self.assertGreater(cambios['version'], version)
+        self.assertEqual(cambios['categorias'], {str(categoria.pk): 'Sillones'})
+        self.assertEqual(cambios['borrados'], [])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheCatalogoTests(TestCase):
+    def setUp(self):
+        self.cliente = APIClient(SERVER_NAME='localhost')
+        self.producto = crear_producto(existencias=2)
+
+    def test_solo_invalida_si_cambia_el_stock(self):
+        version = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            reservar(self.producto.pk, 1)
+        self.assertEqual(version_catalogo(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservar(self.producto.pk, 1)
+        self.assertGreater(version_catalogo(), version)
+
+    def test_existencias_fuera_de_la_cache(self):
+        listado = self.cliente.get('/api/productos/').json()
+        self.assertNotIn('existencias', listado[0])
+        self.assertTrue(listado[0]['stock'])
+        reservar(self.producto.pk, 1)
+        existencias = self.cliente.get('/api/productos/existencias/', {'ids': self.producto.pk}).json()
+        self.assertEqual(existencias, [{'id': self.producto.pk, 'existencias': 1, 'stock': True}])
+        self.assertEqual(self.cliente.get('/api/productos/existencias/', {'ids': 'abc'}).status_code, 400)
+
+    @override_settings(DATABASES_LECTURA=['default'])
+    def test_no_guarda_lecturas_de_replica_recien_invalidada(self):
+        invalidar_catalogo()
+        self.cliente.get('/api/categorias/')
+        Categoria.objects.filter(pk=self.producto.categoria_id).update(nombre='Sillones')
+        self.assertEqual(self.cliente.get('/api/categorias/').json()[0]['nombre'], 'Sillones')
+
+
+class RecomendacionesTests(TestCase):
+    def test_similares_muestrea_candidatos_con_semilla(self):
+        categoria = crear_producto(existencias=1).categoria
+        for numero in range(11):
+            Producto.objects.create(nombre=f'Sofá {numero}', descripcion='Sofá', precio=100, peso=30,
+                                    categoria=categoria, imagen='https://example.com/sofa.jpg')
+        with mock.patch('api.recomendaciones.MAX_CANDIDATOS', 3):
+            primera = list(similares(top=3, semilla=7))
+            self.assertEqual(list(similares(top=3, semilla=7)), primera)
+        # Con muestreo los candidatos no son siempre los primeros por pk
+        primeros = set(Producto.objects.order_by('pk').values_list('pk', flat=True)[:3])
+        self.assertFalse({vecino for _, vecino, _ in primera} <= primeros)
+
+        self.assertEqual(guardar_relacionados('similar', iter(primera)), len(primera))
+        self.assertEqual(ProductoRelacionado.objects.filter(tipo='similar').count(), len(primera))
+
+    def test_relacionados_de_producto_inexistente(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        self.assertEqual(cliente.get('/api/productos/abc/relacionados/').status_code, 404)
+        self.assertEqual(cliente.get('/api/productos/999999/relacionados/').status_code, 404)
+        producto = crear_producto(existencias=1)
+        self.assertEqual(cliente.get(f'/api/productos/{producto.pk}/relacionados/').json(), [])
+
+
+ejecutadas = []
+
+
+@tarea('prueba_correcta')
+def _tarea_correcta(valor):
+    ejecutadas.append(valor)
+
+
+@tarea('prueba_erronea')
+def _tarea_erronea():
+    raise RuntimeError('fallo de prueba')
+
+
+@override_settings(TAREAS_SINCRONAS=False, TAREAS_BACKOFF_BASE=10)
+class TareasTests(TestCase):
+    def test_reclamar_y_ejecutar(self):
+        encolar('prueba_correcta', 7)
+        encolar('prueba_correcta', 8, retraso=timedelta(hours=1))
+        reclamadas = reclamar_tareas('worker-1', limite=5)
+        self.assertEqual(len(reclamadas), 1)
+        self.assertEqual((reclamadas[0].estado, reclamadas[0].intentos, reclamadas[0].worker),
+                         ('en_curso', 1, 'worker-1'))
+        self.assertEqual(reclamar_tareas('worker-2'), [])
+
+        del ejecutadas[:]
+        self.assertTrue(ejecutar_tarea(reclamadas[0]))
+        self.assertEqual(ejecutadas, [7])
+        self.assertEqual(Tarea.objects.get(pk=reclamadas[0].pk).estado, 'completada')
+
+    def test_reintento_con_espera_y_fallida_al_agotar_intentos(self):
+        pk = encolar('prueba_erronea', max_intentos=2).pk
+        antes = timezone.now()
+        with self.assertLogs('api.tareas', 'WARNING'):
+            self.assertFalse(ejecutar_tarea(reclamar_tareas('worker-1')[0]))
+        tarea_ = Tarea.objects.get(pk=pk)
+        self.assertEqual(tarea_.estado, 'pendiente')
+        self.assertIn('fallo de prueba', tarea_.error)
+        # Primer reintento: 10 s ± 20 %
+        self.assertGreaterEqual(tarea_.ejecutar_despues, antes + timedelta(seconds=8))
+        self.assertEqual(reclamar_tareas('worker-1'), [])
+
+        Tarea.objects.filter(pk=pk).update(ejecutar_despues=timezone.now())
+        with self.assertLogs('api.tareas', 'ERROR'):
+            self.assertFalse(ejecutar_tarea(reclamar_tareas('worker-1')[0]))
+        tarea_ = Tarea.objects.get(pk=pk)
+        self.assertEqual((tarea_.estado, tarea_.intentos), ('fallida', 2))
+        self.assertIsNotNone(tarea_.fecha_fin)
+
+    def test_recuperar_bloqueadas(self):
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        muerta = Tarea.objects.create(nombre='prueba_correcta', estado='en_curso', intentos=1, max_intentos=3,
+                                      fecha_inicio=hace_una_hora)
+        agotada = Tarea.objects.create(nombre='prueba_correcta', estado='en_curso', intentos=3, max_intentos=3,
+                                       fecha_inicio=hace_una_hora)
+        en_curso = Tarea.objects.create(nombre='prueba_correcta', estado='en_curso', intentos=1,
+                                        fecha_inicio=timezone.now())
+        with self.assertLogs('api.tareas', 'ERROR'):
+            self.assertEqual(recuperar_bloqueadas(), 1)
+        estados = dict(Tarea.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados, {muerta.pk: 'pendiente', agotada.pk: 'fallida', en_curso.pk: 'en_curso'})
+
+
+class ImagenesTests(SimpleTestCase):
+    def test_url_solo_a_direcciones_publicas(self):
+        for url in ('ftp://example.com/a.jpg', 'http://127.0.0.1/a.jpg', 'http://10.0.0.8/a.jpg',
+                    'http://169.254.169.254/latest/meta-data/', 'http://[::1]/a.jpg', 'http://0.0.0.0/a.jpg',
+                    'http://224.0.0.1/a.jpg', 'http://[::ffff:192.168.1.1]/a.jpg'):
+            with self.subTest(url=url), self.assertRaises(ImagenNoValida):
+                validar_url_imagen(url)
+        with mock.patch('socket.getaddrinfo', return_value=[(2, 1, 6, '', ('93.184.216.34', 80))]):
+            validar_url_imagen('https://example.com/a.jpg')
+
+    def test_descarga_conecta_a_la_direccion_validada(self):
+        cabeceras = []
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cabeceras.append(self.headers['Host'])
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'imagen')
+
+            def log_message(self, *args):
+                pass
+
+        servidor = HTTPServer(('127.0.0.1', 0), Manejador)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        url = f'http://imagenes.invalid:{servidor.server_port}/a.jpg'
+        # El nombre no resuelve: la descarga solo funciona si se conecta a la dirección validada
+        with mock.patch('api.imagenes.validar_url_imagen', return_value='127.0.0.1'):
+            self.assertEqual(descargar_imagen(url), b'imagen')
+        self.assertEqual(cabeceras, [f'imagenes.invalid:{servidor.server_port}'])
+
+    def test_media_solo_sirve_miniaturas(self):
+        cliente = APIClient(SERVER_NAME='localhost')
+        with tempfile.TemporaryDirectory() as directorio, override_settings(MEDIA_ROOT=directorio):
+            default_storage.save('productos/abc-320.jpg', ContentFile(b'jpeg'))
+            default_storage.save('otros/privado.txt', ContentFile(b'privado'))
+            respuesta = cliente.get('/media/productos/abc-320.jpg')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertIn('immutable', respuesta['Cache-Control'])
+            respuesta.close()
+            self.assertEqual(cliente.get('/media/otros/privado.txt').status_code, 404)
+            self.assertEqual(cliente.get('/media/productos/../otros/privado.txt').status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PrimariaTrasEscrituraTests(SimpleTestCase):
+    def test_lecturas_del_mismo_cliente_van_a_la_principal(self):
+        peticiones = RequestFactory()
+        marcar_escritura(peticiones.post('/api/pedidos/', HTTP_AUTHORIZATION='Bearer uno'))
+        self.assertTrue(escribio_hace_poco(peticiones.get('/api/pedidos/', HTTP_AUTHORIZATION='Bearer uno')))
+        self.assertFalse(escribio_hace_poco(peticiones.get('/api/pedidos/', HTTP_AUTHORIZATION='Bearer dos')))
+        self.assertFalse(escribio_hace_poco(peticiones.get('/api/pedidos/')))
+
+
+class LecturaRouterTests(SimpleTestCase):
+    @override_settings(DATABASES_LECTURA=[f'replica{n}' for n in range(8)])
+    def test_una_replica_por_bloque(self):
+        router = LecturaRouter()
+        self.assertIsNone(router.db_for_read(Producto))
+        with usar_lectura():
+            alias = router.db_for_read(Producto)
+            self.assertIn(alias, [f'replica{n}' for n in range(8)])
+            self.assertEqual({router.db_for_read(Producto) for _ in range(50)}, {alias})
+            with usar_lectura():
+                self.assertEqual(router.db_for_read(Producto), alias)
+
+
+class IdempotenciaTests(TestCase):
+    def setUp(self):
+        self.cliente = APIClient(SERVER_NAME='localhost')
+        registro = self.cliente.post('/api/usuarios/registro/', {
+            'nombre': 'Ana', 'apellido': 'López', 'email': 'ana@example.com', 'contraseña': 'secreta',
+            'confirmar_contraseña': 'secreta', 'direccion': 'Calle Mayor 1', 'telefono': '600000000',
+        }, format='json').json()
+        self.cliente.credentials(HTTP_AUTHORIZATION=f"Bearer {registro['access']}")
+        self.producto = crear_producto(existencias=1)
+        self.carrito = Carrito.objects.create(usuario_id=registro['usuario']['id'])
+        self.datos = {'carrito': self.carrito.pk, 'producto': self.producto.pk, 'cantidad': 1, 'precio_total': '100.00'}
+
+    def crear_item(self, clave, cliente=None):
+        return (cliente or self.cliente).post('/api/items-carrito/', self.datos, format='json',
+                                              HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_repite_la_respuesta(self):
+        primera = self.crear_item('clave-1')
+        segunda = self.crear_item('clave-1')
+        self.assertEqual(primera.status_code, 201)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(ItemCarrito.objects.count(), 1)
+
+    def test_clave_con_otro_contenido(self):
+        self.crear_item('clave-1')
+        self.datos['cantidad'] = 2
+        self.assertEqual(self.crear_item('clave-1').status_code, 422)
+
+    def test_errores_no_se_guardan(self):
+        Producto.objects.filter(pk=self.producto.pk).update(existencias=0)
+        self.assertEqual(self.crear_item('clave-1').status_code, 409)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        Producto.objects.filter(pk=self.producto.pk).update(existencias=1)
+        self.assertEqual(self.crear_item('clave-1').status_code, 201)
+
+    def test_propietario_es_el_usuario_del_token(self):
+        self.crear_item('clave-1')
+        usuario_id = self.carrito.usuario_id
+        self.assertTrue(ClaveIdempotencia.objects.filter(propietario=f'usuario:{usuario_id}', clave='clave-1').exists())
+
+    def test_requiere_autenticacion(self):
+        self.assertEqual(self.crear_item('clave-1', APIClient(SERVER_NAME='localhost')).status_code, 401)
+        self.assertFalse(ItemCarrito.objects.exists())
+
+
+class SobreventaTests(TransactionTestCase):
+    def test_reservas_concurrentes_no_venden_de_mas(self):
+        existencias = 20
+        producto = crear_producto(existencias)
+        vendidas = []
+        bloqueo = threading.Lock()
+
+        def comprar():
+            try:
+                while True:
+                    try:
+                        reservar(producto.pk, 1)
+                    except StockInsuficiente:
+                        return
+                    except OperationalError:
+                        # Base de datos ocupada por otro hilo: se reintenta
+                        continue
+                    with bloqueo:
+                        vendidas.append(1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(vendidas), existencias)
+        self.assertEqual(producto.existencias, 0)
+        self.assertEqual(sum(ReservaStock.objects.values_list('cantidad', flat=True)), existencias)
+
+    def test_checkouts_concurrentes_crean_un_pedido(self):
+        producto = crear_producto(existencias=10)
+        carrito = Carrito.objects.create(usuario=crear_usuario())
+        ItemCarrito.objects.create(carrito=carrito, producto=producto, cantidad=2, precio_total=200)
+        ItemCarrito.objects.create(carrito=carrito, producto=producto, cantidad=1, precio_total=100)
+        pedidos = []
+        bloqueo = threading.Lock()
+
+        def pagar():
+            try:
+                while True:
+                    try:
+                        pedido = checkout(carrito, 'Calle Mayor 1', 'tarjeta')
+                    except ValueError:
+                        return
+                    except OperationalError:
+                        continue
+                    with bloqueo:
+                        pedidos.append(pedido.pk)
+                    return
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=pagar) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        producto.refresh_from_db()
+        self.assertEqual(len(pedidos), 1)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(producto.existencias, 7)
@@ -3,7 +3,7 @@ from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (UsuarioViewSet, CategoriaViewSet, ProductoViewSet, ServicioViewSet, 
                     WishlistViewSet, CarritoViewSet, ItemCarritoViewSet, PedidoViewSet, 
-                    DetallePedidoViewSet, EstanciaViewSet)
+                    DetallePedidoViewSet, EstanciaViewSet, VentaDiariaViewSet, CatalogoViewSet)
 
 router = DefaultRouter()
 router.register(r'usuarios', UsuarioViewSet)
@@ -16,6 +16,8 @@ router.register(r'carritos', CarritoViewSet)
 router.register(r'items-carrito', ItemCarritoViewSet)
 router.register(r'pedidos', PedidoViewSet)
 router.register(r'detalles-pedido', DetallePedidoViewSet)
+router.register(r'ventas', VentaDiariaViewSet)
+router.register(r'catalogo', CatalogoViewSet, basename='catalogo')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import DetallePedido, VentaDiaria
+from .tareas import tarea, encolar
+
+
+def _limites_dia(fecha):
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def agregar_detalles(detalles):
+    """Agrupa líneas de pedido por día, producto y estado del pedido."""
+    return (detalles
+            .annotate(fecha=TruncDate('pedido__fecha_pedido'))
+            .values('fecha', 'producto_id', 'producto__categoria_id', 'pedido__estado')
+            .annotate(unidades=Sum('cantidad'), ingresos=Sum('precio_total'),
+                      pedidos=Count('pedido', distinct=True))
+            .order_by())
+
+
+def filas_venta(agregados):
+    """Convierte el resultado de `agregar_detalles` en instancias de VentaDiaria."""
+    for fila in agregados:
+        yield VentaDiaria(
+            fecha=fila['fecha'],
+            producto_id=fila['producto_id'],
+            categoria_id=fila['producto__categoria_id'],
+            estado=fila['pedido__estado'],
+            unidades=fila['unidades'],
+            ingresos=fila['ingresos'],
+            pedidos=fila['pedidos'],
+        )
+
+
+def actualizar_ventas(pares):
+    """Recalcula el agregado solo para los pares (fecha, producto_id) afectados."""
+    por_fecha = defaultdict(set)
+    for fecha, producto_id in pares:
+        por_fecha[fecha].add(producto_id)
+
+    with transaction.atomic():
+        for fecha, productos in por_fecha.items():
+            inicio, fin = _limites_dia(fecha)
+            VentaDiaria.objects.filter(fecha=fecha, producto_id__in=productos).delete()
+            detalles = DetallePedido.objects.filter(
+                producto_id__in=productos,
+                pedido__fecha_pedido__gte=inicio,
+                pedido__fecha_pedido__lt=fin,
+            )
+            VentaDiaria.objects.bulk_create(filas_venta(agregar_detalles(detalles)))
+
+
+@tarea('actualizar_ventas')
+def _actualizar_ventas(pares):
+    actualizar_ventas((parse_date(fecha), producto_id) for fecha, producto_id in pares)
+
+
+def programar_actualizacion(pares):
+    """Encola el recálculo de los pares afectados; la tarea solo existe si la transacción se confirma."""
+    pares = sorted(set(pares))
+    if pares:
+        encolar('actualizar_ventas', [[fecha.isoformat(), producto_id] for fecha, producto_id in pares])
+
+
+def pares_de_pedidos(pedidos):
+    """Pares (fecha, producto_id) que cubren todas las líneas de los pedidos dados."""
+    return {
+        (timezone.localdate(fecha_pedido), producto_id)
+        for fecha_pedido, producto_id in DetallePedido.objects.filter(pedido__in=pedidos)
+        .values_list('pedido__fecha_pedido', 'producto_id').distinct()
+    }
+
+
+def reconstruir_ventas(desde, hasta, dias_por_bloque=30):
+    """Reconstruye el agregado entre dos fechas (incluidas) por bloques de días. Devuelve las filas creadas."""
+    creadas = 0
+    inicio_bloque = desde
+    while inicio_bloque <= hasta:
+        fin_bloque = min(inicio_bloque + timedelta(days=dias_por_bloque - 1), hasta)
+        inicio, _ = _limites_dia(inicio_bloque)
+        _, fin = _limites_dia(fin_bloque)
+        with transaction.atomic():
+            VentaDiaria.objects.filter(fecha__gte=inicio_bloque, fecha__lte=fin_bloque).delete()
+            detalles = DetallePedido.objects.filter(pedido__fecha_pedido__gte=inicio, pedido__fecha_pedido__lt=fin)
+            creadas += len(VentaDiaria.objects.bulk_create(filas_venta(agregar_detalles(detalles)), batch_size=1000))
+        inicio_bloque = fin_bloque + timedelta(days=1)
+    return creadas
@@ -1,13 +1,129 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
+from rest_framework.exceptions import APIException, ValidationError
+from django.db import transaction
+from django.db.models import Q, Sum
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
+from compactlifes.routers import usar_lectura, escribio_hace_poco
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido, Estancia
+from .models import (Usuario, Categoria, Producto, Servicio, Wishlist, Carrito, ItemCarrito, Pedido, DetallePedido,
+                     Estancia, VentaDiaria, ReservaStock, ProductoRelacionado, ClaveIdempotencia)
 from .serializers import (UsuarioSerializer, CategoriaSerializer, ProductoSerializer, ServicioSerializer, 
                           WishlistSerializer, CarritoSerializer, ItemCarritoSerializer, PedidoSerializer, 
                           DetallePedidoSerializer, RegistroSerializer, LoginSerializer, EstanciaSerializer,
-                          ActualizarUsuarioSerializer)
+                          ActualizarUsuarioSerializer, ActualizacionMasivaProductosSerializer,
+                          VentaDiariaSerializer, HistorialEstadoPedidoSerializer, TransicionPedidosSerializer,
+                          ImagenProductoSerializer, CheckoutSerializer)
+from .imagenes import encolar_procesado, validar_imagen, ImagenNoValida
+from .inventario import (StockInsuficiente, reservar, ajustar_reserva, liberar_reservas, checkout,
+                         descontar_existencias, devolver_existencias, cambiar_unidades)
+from .catalogo import snapshot, cambios_desde
+from .compresion import comprimir, respuesta_precomprimida
+from .cache import version_catalogo, replicas_al_dia
+from .idempotencia import (ClaveEnUso, ClaveReutilizada, propietario_de, huella_de, reclamar, completar,
+                           liberar)
+from .auth import EmailEnUso, autenticar, representar_usuario, respuesta_tokens
+from .services import filtrar_productos, actualizar_productos, transicionar_pedidos
+
+class LecturaMixin:
+    """
+    Las peticiones de solo lectura del ViewSet usan una réplica si existe, salvo que el
+    cliente haya escrito hace poco (ver PrimariaTrasEscrituraMiddleware).
+    """
+    METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+    def dispatch(self, request, *args, **kwargs):
+        if (request.method not in self.METODOS_LECTURA or not settings.DATABASES_LECTURA
+                or escribio_hace_poco(request)):
+            return super().dispatch(request, *args, **kwargs)
+        with usar_lectura():
+            return super().dispatch(request, *args, **kwargs)
+
+class StockNoDisponible(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'No hay existencias suficientes'
+
+class CacheCatalogoMixin:
+    """
+    Guarda las respuestas GET en JSON ya comprimidas, de modo que el coste de serializar y
+    comprimir se paga una vez por versión del catálogo y no en cada petición. Las respuestas
+    no incluyen las existencias exactas (cambian con cada compra), solo `stock`.
+
+    Un fallo se resuelve en la réplica como cualquier lectura, pero justo después de una
+    invalidación la réplica puede no tener aún el cambio: la respuesta solo se guarda si se
+    leyó de la principal o ya pasó el retraso máximo de las réplicas.
+    """
+    acciones_sin_cache = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or getattr(self, 'action_map', {}).get('get') in self.acciones_sin_cache:
+            return super().dispatch(request, *args, **kwargs)
+
+        peticion = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        clave = f"respuesta:{version_catalogo()}:{hashlib.sha1(peticion.encode()).hexdigest()}"
+        entrada = cache.get(clave)
+        if entrada is None:
+            guardar = not settings.DATABASES_LECTURA or escribio_hace_poco(request) or replicas_al_dia()
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK or not getattr(
+                response, 'accepted_media_type', ''
+            ).startswith('application/json'):
+                return response
+            response.render()
+            variantes = ({'identity': response.content}
+                         if len(response.content) < settings.COMPRESION_TAMANO_MINIMO
+                         else comprimir(response.content))
+            entrada = {'content_type': response['Content-Type'], 'variantes': variantes}
+            if guardar:
+                cache.set(clave, entrada, settings.CACHE_CATALOGO_TIMEOUT)
+        return respuesta_precomprimida(request, entrada['variantes'], entrada['content_type'])
+
+class IdempotenciaMixin:
+    """
+    Con la cabecera Idempotency-Key, un POST repetido devuelve la respuesta guardada del
+    primero en lugar de crear otro registro (ver api.idempotencia).
+    """
+
+    def create(self, request, *args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        if not clave:
+            return super().create(request, *args, **kwargs)
+        if len(clave) > ClaveIdempotencia._meta.get_field('clave').max_length:
+            raise ValidationError({'Idempotency-Key': 'Clave demasiado larga'})
+
+        propietario = propietario_de(request)
+        if propietario is None:
+            return Response({'error': 'La cabecera Idempotency-Key requiere autenticación'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            guardada = reclamar(propietario, clave, huella_de(request))
+        except ClaveEnUso:
+            return Response({'error': 'Ya hay una petición en curso con esta Idempotency-Key'},
+                            status=status.HTTP_409_CONFLICT)
+        except ClaveReutilizada:
+            return Response({'error': 'La Idempotency-Key ya se usó con otro contenido'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if guardada is not None:
+            return Response(guardada.respuesta, status=guardada.codigo, headers={'Idempotent-Replayed': 'true'})
+
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            liberar(propietario, clave)
+            raise
+        # Solo se repiten los éxitos: un error (por ejemplo sin stock) puede no repetirse al reintentar
+        if status.is_success(response.status_code):
+            completar(propietario, clave, response.status_code, response.data)
+        else:
+            liberar(propietario, clave)
+        return response
 
 class UsuarioViewSet(viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
@@ -18,16 +134,12 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         """Registrar un nuevo usuario"""
         serializer = RegistroSerializer(data=request.data)
         if serializer.is_valid():
-            usuario = serializer.save()
-            
-            # Generar tokens JWT
-            refresh = RefreshToken.for_user(usuario)
-            
-            return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-                'usuario': UsuarioSerializer(usuario).data
-            }, status=status.HTTP_201_CREATED)
+            try:
+                usuario = serializer.save()
+            except EmailEnUso:
+                return Response({'email': ['Ya existe un usuario con este email.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(respuesta_tokens(usuario), status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['post'], url_path='login')
@@ -35,24 +147,10 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         """Login de usuario"""
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
-            email = serializer.validated_data['email']
-            contraseña = serializer.validated_data['contraseña']
-            
-            try:
-                usuario = Usuario.objects.get(email=email)
-                if usuario.check_password(contraseña):
-                    #tokens JWT
-                    refresh = RefreshToken.for_user(usuario)
-                    
-                    return Response({
-                        'refresh': str(refresh),
-                        'access': str(refresh.access_token),
-                        'usuario': UsuarioSerializer(usuario).data
-                    })
-                else:
-                    return Response({'error': 'Credenciales inválidas'}, status=status.HTTP_401_UNAUTHORIZED)
-            except Usuario.DoesNotExist:
+            usuario = autenticar(serializer.validated_data['email'], serializer.validated_data['contraseña'])
+            if usuario is None:
                 return Response({'error': 'Credenciales inválidas'}, status=status.HTTP_401_UNAUTHORIZED)
+            return Response(respuesta_tokens(usuario))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
     @action(detail=True, methods=['put'], url_path='actualizar')
@@ -64,12 +162,12 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             usuario_actualizado = serializer.save()
             return Response({
-                'usuario': UsuarioSerializer(usuario_actualizado).data,
+                'usuario': representar_usuario(usuario_actualizado),
                 'mensaje': 'Datos actualizados correctamente'
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CacheCatalogoMixin, LecturaMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     
@@ -85,7 +183,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     def productos(self, request, pk=None):
         """Obtener todos los productos de una categoría específica."""
         categoria = self.get_object()
-        productos = Producto.objects.filter(categoria=categoria)
+        productos = Producto.objects.para_catalogo().filter(categoria=categoria)
         serializer = ProductoSerializer(productos, many=True, context={'request': request})
         return Response(serializer.data)
         
@@ -96,7 +194,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(categorias_con_productos, many=True)
         return Response(serializer.data)
 
-class EstanciaViewSet(viewsets.ModelViewSet):
+class EstanciaViewSet(CacheCatalogoMixin, LecturaMixin, viewsets.ModelViewSet):
     queryset = Estancia.objects.all()
     serializer_class = EstanciaSerializer
     
@@ -112,13 +210,15 @@ class EstanciaViewSet(viewsets.ModelViewSet):
     def productos(self, request, pk=None):
         """Obtener todos los productos de una estancia específica."""
         estancia = self.get_object()
-        productos = Producto.objects.filter(estancia=estancia)
+        productos = Producto.objects.para_catalogo().filter(estancia=estancia)
         serializer = ProductoSerializer(productos, many=True, context={'request': request})
         return Response(serializer.data)
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CacheCatalogoMixin, LecturaMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    acciones_sin_cache = ('existencias',)
+    MAX_IDS_EXISTENCIAS = 200
     
     def get_serializer_context(self):
         """Añade el request al contexto del serializer."""
@@ -127,7 +227,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Permite filtrar productos por nombre y asegura que se incluyan los datos relacionados."""
-        queryset = Producto.objects.all().select_related('categoria', 'estancia')
+        queryset = Producto.objects.para_catalogo()
         nombre = self.request.query_params.get('nombre', None)
         if nombre:
             queryset = queryset.filter(nombre__icontains=nombre)
@@ -154,54 +254,146 @@ class ProductoViewSet(viewsets.ModelViewSet):
             request.data._mutable = False
             
         return super().update(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        producto = serializer.save()
+        encolar_procesado(producto.pk)
+
+    def perform_update(self, serializer):
+        imagen_anterior = serializer.instance.imagen
+        producto = serializer.save()
+        if producto.imagen != imagen_anterior:
+            encolar_procesado(producto.pk)
+
+    @action(detail=True, methods=['post'], url_path='imagen')
+    def imagen(self, request, pk=None):
+        """Subir un archivo o indicar una URL para generar las miniaturas del producto"""
+        producto = self.get_object()
+        serializer = ImagenProductoSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        archivo = serializer.validated_data.get('archivo')
+        if archivo:
+            contenido = archivo.read()
+            try:
+                validar_imagen(contenido)
+            except ImagenNoValida as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            encolar_procesado(producto.pk, contenido)
+        else:
+            Producto.objects.filter(pk=producto.pk).update(imagen=serializer.validated_data['url'])
+            encolar_procesado(producto.pk)
+        return Response({'mensaje': 'Imagen en proceso'}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], url_path='actualizar-masivo')
+    def actualizar_masivo(self, request):
+        """Actualizar precio, descuento y/o existencias de muchos productos en una sola operación"""
+        serializer = ActualizacionMasivaProductosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        datos = serializer.validated_data
+        productos = filtrar_productos(datos.get('ids'), datos.get('categoria'), datos.get('estancia'))
+        actualizados = actualizar_productos(productos, datos)
+        return Response({'actualizados': actualizados})
         
+    @action(detail=False, methods=['get'], url_path='existencias')
+    def existencias(self, request):
+        """Existencias actuales de los productos indicados en ?ids=1,2,3 (sin caché)"""
+        ids = request.query_params.get('ids', '').split(',')
+        if not all(pk.isdigit() for pk in ids) or len(ids) > self.MAX_IDS_EXISTENCIAS:
+            raise ValidationError({'ids': f'Hasta {self.MAX_IDS_EXISTENCIAS} ids de producto separados por comas'})
+        return Response(Producto.objects.filter(pk__in=ids).order_by('pk').values('id', 'existencias', 'stock'))
+
     @action(detail=False, methods=['get'], url_path='ofertas')
     def ofertas(self, request):
-        """Obtener productos con descuento mayor a 0"""
-        productos_con_descuento = Producto.objects.filter(descuento__gt=0)
+        """Obtener productos con descuento mayor a 0 (incluye promociones vigentes)"""
+        productos_con_descuento = Producto.objects.para_catalogo().filter(descuento_efectivo__gt=0)
         serializer = self.get_serializer(productos_con_descuento, many=True)
         return Response(serializer.data)
         
     @action(detail=False, methods=['get'], url_path='sin-ofertas')
     def sin_ofertas(self, request):
-        """Obtener productos sin descuento (descuento = 0)"""
-        productos_sin_descuento = Producto.objects.filter(descuento=0)
+        """Obtener productos sin descuento ni promociones vigentes"""
+        productos_sin_descuento = Producto.objects.para_catalogo().filter(descuento_efectivo=0)
         serializer = self.get_serializer(productos_sin_descuento, many=True)
         return Response(serializer.data)
         
     @action(detail=False, methods=['get'], url_path='por-categoria/(?P<categoria_id>[^/.]+)')
     def por_categoria(self, request, categoria_id=None):
         """Obtener productos por categoría"""
-        productos = Producto.objects.filter(categoria_id=categoria_id)
+        productos = Producto.objects.para_catalogo().filter(categoria_id=categoria_id)
         serializer = self.get_serializer(productos, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='por-estancia/(?P<estancia_id>[^/.]+)')
     def por_estancia(self, request, estancia_id=None):
         """Obtener productos por estancia"""
-        productos = Producto.objects.filter(estancia_id=estancia_id)
+        productos = Producto.objects.para_catalogo().filter(estancia_id=estancia_id)
         serializer = self.get_serializer(productos, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='buscar/(?P<texto>[^/.]+)')
     def buscar(self, request, texto=None):
         """Buscar productos por nombre o descripción"""
-        productos = Producto.objects.filter(nombre__icontains=texto) | Producto.objects.filter(descripcion__icontains=texto)
+        productos = Producto.objects.para_catalogo().filter(Q(nombre__icontains=texto) | Q(descripcion__icontains=texto))
         serializer = self.get_serializer(productos, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], url_path='destacados')
     def destacados(self, request):
         """Obtener productos destacados (los más recientes)"""
-        productos_destacados = Producto.objects.all().order_by('-fecha_creacion')[:8]
+        productos_destacados = Producto.objects.para_catalogo().order_by('-fecha_creacion')[:8]
         serializer = self.get_serializer(productos_destacados, many=True)
         return Response(serializer.data)
 
-class ServicioViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], url_path='relacionados')
+    def relacionados(self, request, pk=None):
+        """Productos relacionados precalculados (?tipo=compra|similar, por defecto compra)"""
+        tipo = request.query_params.get('tipo', 'compra')
+        if tipo not in dict(ProductoRelacionado.TIPOS):
+            raise ValidationError({'tipo': "Debe ser 'compra' o 'similar'"})
+        producto = get_object_or_404(Producto.objects.only('pk'), pk=pk)
+        productos = (
+            Producto.objects.para_catalogo()
+            .filter(recomendado_en__producto=producto, recomendado_en__tipo=tipo)
+            .order_by('-recomendado_en__puntuacion')
+        )
+        serializer = self.get_serializer(productos, many=True)
+        return Response(serializer.data)
+
+class CatalogoViewSet(LecturaMixin, viewsets.ViewSet):
+    """Catálogo completo para que el cliente guarde una copia local y la sincronice por versiones."""
+
+    @action(detail=False, methods=['get'], url_path='snapshot')
+    def snapshot(self, request):
+        """Catálogo completo en formato columnar, comprimido y generado una vez por versión"""
+        version, variantes = snapshot()
+        etag = f'"catalogo-{version}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            patch_vary_headers(response, ('Accept-Encoding',))
+        else:
+            response = respuesta_precomprimida(request, variantes)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cambios')
+    def cambios(self, request):
+        """Productos guardados y borrados desde la versión indicada en ?desde="""
+        desde = request.query_params.get('desde', '')
+        if not desde.isdigit():
+            return Response({"error": "Se requiere 'desde' con un número de versión"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(cambios_desde(int(desde)))
+
+class ServicioViewSet(CacheCatalogoMixin, LecturaMixin, viewsets.ModelViewSet):
     queryset = Servicio.objects.all()
     serializer_class = ServicioSerializer
 
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(IdempotenciaMixin, viewsets.ModelViewSet):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
 
@@ -209,14 +401,205 @@ class CarritoViewSet(viewsets.ModelViewSet):
     queryset = Carrito.objects.all()
     serializer_class = CarritoSerializer
 
-class ItemCarritoViewSet(viewsets.ModelViewSet):
+    def perform_destroy(self, instance):
+        """Devuelve al stock las unidades reservadas por el carrito antes de borrarlo."""
+        with transaction.atomic():
+            liberar_reservas(ReservaStock.objects.filter(item__carrito=instance))
+            instance.delete()
+
+    @action(detail=True, methods=['post'], url_path='checkout')
+    def checkout(self, request, pk=None):
+        """Convertir el carrito en un pedido consumiendo las reservas de stock"""
+        carrito = self.get_object()
+        serializer = CheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            pedido = checkout(carrito, **serializer.validated_data)
+        except StockInsuficiente as exc:
+            return Response({"error": str(exc), "producto": exc.producto_id}, status=status.HTTP_409_CONFLICT)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(PedidoSerializer(pedido).data, status=status.HTTP_201_CREATED)
+
+class ItemCarritoViewSet(IdempotenciaMixin, viewsets.ModelViewSet):
     queryset = ItemCarrito.objects.all()
     serializer_class = ItemCarritoSerializer
 
-class PedidoViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        """Reserva las unidades de la línea; sin stock suficiente no se crea."""
+        try:
+            with transaction.atomic():
+                item = serializer.save()
+                reservar(item.producto_id, item.cantidad, item)
+        except StockInsuficiente as exc:
+            raise StockNoDisponible({"error": str(exc), "producto": exc.producto_id})
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                ajustar_reserva(serializer.save())
+        except StockInsuficiente as exc:
+            raise StockNoDisponible({"error": str(exc), "producto": exc.producto_id})
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            liberar_reservas(ReservaStock.objects.filter(item=instance))
+            instance.delete()
+
+class PedidoViewSet(IdempotenciaMixin, viewsets.ModelViewSet):
     queryset = Pedido.objects.all()
     serializer_class = PedidoSerializer
 
+    def perform_update(self, serializer):
+        """
+        Bloquea el pedido y vuelve a comprobar la transición con el estado que tiene ya
+        bloqueado: el serializer la validó con el leído antes, que otra petición (por ejemplo
+        una cancelación) puede haber cambiado mientras tanto.
+        """
+        with transaction.atomic():
+            actual = (Pedido.objects.select_for_update().filter(pk=serializer.instance.pk)
+                      .values_list('estado', flat=True).first())
+            serializer.instance.estado = actual
+            nuevo = serializer.validated_data.get('estado', actual)
+            if nuevo != actual and not serializer.instance.puede_pasar_a(nuevo):
+                raise ValidationError({'estado': [f"No se puede pasar de '{actual}' a '{nuevo}'"]})
+            serializer.save()
+
+    @action(detail=False, methods=['post'], url_path='transicion')
+    def transicion(self, request):
+        """Cambiar de estado muchos pedidos a la vez (solo los que admiten la transición)"""
+        serializer = TransicionPedidosSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = serializer.validated_data['ids']
+        movidos = transicionar_pedidos(ids, serializer.validated_data['estado'])
+        return Response({
+            'actualizados': len(movidos),
+            'omitidos': sorted(set(ids) - set(movidos)),
+        })
+
+    @action(detail=False, methods=['get'], url_path='cola')
+    def cola(self, request):
+        """Pedidos en un estado (por defecto 'pagado') en orden de llegada, para preparación"""
+        estado = request.query_params.get('estado', 'pagado')
+        if estado not in Pedido.TRANSICIONES:
+            return Response({"error": f"Estado no válido: {estado}"}, status=status.HTTP_400_BAD_REQUEST)
+        limite = request.query_params.get('limite', '100')
+        if not limite.isdigit():
+            return Response({"error": "'limite' debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+
+        pedidos = (Pedido.objects.filter(estado=estado).order_by('fecha_pedido')
+                   .prefetch_related('detalles')[:int(limite)])
+        serializer = self.get_serializer(pedidos, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='historial')
+    def historial(self, request, pk=None):
+        """Obtener los cambios de estado de un pedido"""
+        pedido = self.get_object()
+        serializer = HistorialEstadoPedidoSerializer(pedido.historial.all(), many=True)
+        return Response(serializer.data)
+
 class DetallePedidoViewSet(viewsets.ModelViewSet):
     queryset = DetallePedido.objects.all()
     serializer_class = DetallePedidoSerializer
+
+    def _pedido_abierto(self, pedido):
+        if pedido.estado == 'cancelado':
+            raise ValidationError({"pedido": "No se pueden modificar las líneas de un pedido cancelado"})
+
+    def perform_create(self, serializer):
+        """Las líneas creadas a mano venden stock igual que el checkout; sin existencias no se crean."""
+        self._pedido_abierto(serializer.validated_data['pedido'])
+        try:
+            with transaction.atomic():
+                descontar_existencias(serializer.validated_data['producto'].pk, serializer.validated_data['cantidad'])
+                serializer.save()
+        except StockInsuficiente as exc:
+            raise StockNoDisponible({"error": str(exc), "producto": exc.producto_id})
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                producto_anterior, cantidad_anterior = (DetallePedido.objects.select_for_update()
+                                                        .filter(pk=serializer.instance.pk)
+                                                        .values_list('producto_id', 'cantidad').get())
+                self._pedido_abierto(serializer.instance.pedido)
+                self._pedido_abierto(serializer.validated_data.get('pedido', serializer.instance.pedido))
+                detalle = serializer.save()
+                cambiar_unidades(producto_anterior, cantidad_anterior, detalle.producto_id, detalle.cantidad)
+        except StockInsuficiente as exc:
+            raise StockNoDisponible({"error": str(exc), "producto": exc.producto_id})
+
+    def perform_destroy(self, instance):
+        """Las unidades vuelven al stock, salvo que ya se devolvieran al cancelar el pedido."""
+        with transaction.atomic():
+            if instance.pedido.estado != 'cancelado':
+                devolver_existencias({instance.producto_id: instance.cantidad})
+            instance.delete()
+
+
+class VentaDiariaViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = VentaDiaria.objects.all()
+    serializer_class = VentaDiariaSerializer
+    AGRUPACIONES = {
+        'dia': 'fecha',
+        'producto': 'producto_id',
+        'categoria': 'categoria_id',
+        'estado': 'estado',
+    }
+
+    def get_queryset(self):
+        """Permite filtrar el agregado por rango de fechas, estado, producto y categoría."""
+        queryset = VentaDiaria.objects.all()
+        params = self.request.query_params
+        for parametro, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+            valor = params.get(parametro)
+            if valor:
+                try:
+                    fecha = parse_date(valor)
+                except ValueError:
+                    fecha = None
+                if fecha is None:
+                    raise ValidationError({parametro: 'Fecha no válida, use el formato AAAA-MM-DD'})
+                queryset = queryset.filter(**{lookup: fecha})
+        estado = params.get('estado')
+        if estado:
+            queryset = queryset.filter(estado__in=estado.split(','))
+        for parametro in ('producto', 'categoria'):
+            valor = params.get(parametro)
+            if valor:
+                if not valor.isdigit():
+                    raise ValidationError({parametro: 'Debe ser un id numérico'})
+                queryset = queryset.filter(**{f'{parametro}_id': valor})
+        return queryset.order_by('fecha', 'producto_id', 'estado')
+
+    @action(detail=False, methods=['get'])
+    def resumen(self, request):
+        """
+        Totales de unidades e ingresos agrupados por día, producto, categoría o estado. El
+        número de pedidos solo se da por producto: el agregado cuenta los pedidos distintos de
+        cada producto, y sumarlos en otras agrupaciones contaría varias veces los pedidos con
+        más de un producto.
+        """
+        agrupar = request.query_params.get('agrupar', 'dia')
+        if agrupar not in self.AGRUPACIONES:
+            return Response(
+                {"error": f"'agrupar' debe ser uno de: {', '.join(self.AGRUPACIONES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        campo = self.AGRUPACIONES[agrupar]
+        totales = {'unidades': Sum('unidades'), 'ingresos': Sum('ingresos')}
+        if agrupar == 'producto':
+            totales['pedidos'] = Sum('pedidos')
+        filas = self.get_queryset().order_by().values(campo).annotate(**totales).order_by(campo)
+        importe = serializers.DecimalField(max_digits=14, decimal_places=2)
+        resultado = []
+        for fila in filas:
+            fila['ingresos'] = importe.to_representation(fila['ingresos'])
+            resultado.append({agrupar: fila.pop(campo), **fila})
+        return Response(resultado)
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from compactlifes.routers import marcar_escritura
+from api.compresion import CODIFICACIONES, comprimir_con, elegir_codificacion
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    Recuerda en la caché compartida a los clientes que acaban de escribir, para que sus
+    siguientes lecturas vayan a la base principal y no a una réplica con retraso.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if settings.DATABASES_LECTURA and request.method not in METODOS_SEGUROS and response.status_code < 400:
+            marcar_escritura(request)
+        return response
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas JSON con brotli o gzip según Accept-Encoding, a partir de
+    settings.COMPRESION_TAMANO_MINIMO bytes. Las respuestas ya comprimidas (por ejemplo las
+    del catálogo, guardadas comprimidas en caché) se dejan tal cual.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith('application/json')
+            or len(response.content) < settings.COMPRESION_TAMANO_MINIMO
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = elegir_codificacion(request, CODIFICACIONES)
+        if codificacion == 'identity':
+            return response
+
+        contenido = comprimir_con(response.content, codificacion)
+        if len(contenido) >= len(response.content):
+            return response
+        response.content = contenido
+        response['Content-Length'] = str(len(contenido))
+        response['Content-Encoding'] = codificacion
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
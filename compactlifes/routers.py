@@ -0,0 +1,85 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS
+
+# Alias de lectura elegido para el bloque `usar_lectura()` en curso
+_alias_lectura = ContextVar('alias_lectura', default=None)
+_usar_primaria = ContextVar('usar_primaria', default=False)
+
+
+@contextmanager
+def usar_lectura():
+    """
+    Dentro del bloque, las lecturas van a una réplica o conexión de lectura si hay alguna
+    configurada. Se elige una sola para todo el bloque: dos consultas de la misma petición
+    (por ejemplo la versión del catálogo y sus productos) no pueden ver réplicas con distinto
+    retraso.
+    """
+    alias = _alias_lectura.get()
+    if alias is None and settings.DATABASES_LECTURA:
+        alias = random.choice(settings.DATABASES_LECTURA)
+    token = _alias_lectura.set(alias)
+    try:
+        yield
+    finally:
+        _alias_lectura.reset(token)
+
+
+@contextmanager
+def usar_primaria():
+    """Dentro del bloque todas las lecturas van a la base principal, aunque haya un `usar_lectura()` anidado."""
+    token = _usar_primaria.set(True)
+    try:
+        yield
+    finally:
+        _usar_primaria.reset(token)
+
+
+def _clave_cliente(request):
+    """
+    Identifica al cliente sin depender de cookies (las apps móviles y los clientes con token
+    no las guardan): el token de Authorization si lo hay, si no la IP del cliente.
+    """
+    autorizacion = request.META.get('HTTP_AUTHORIZATION')
+    if autorizacion:
+        cliente = 'token:' + autorizacion
+    else:
+        reenviada = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
+        cliente = 'ip:' + (reenviada or request.META.get('REMOTE_ADDR', ''))
+    return 'primaria:' + hashlib.sha256(cliente.encode()).hexdigest()
+
+
+def marcar_escritura(request):
+    """Durante REPLICA_RETRASO_MAXIMO segundos las lecturas del cliente irán a la base principal."""
+    cache.set(_clave_cliente(request), 1, settings.REPLICA_RETRASO_MAXIMO)
+
+
+def escribio_hace_poco(request):
+    return cache.get(_clave_cliente(request)) is not None
+
+
+class LecturaRouter:
+    """Envía a settings.DATABASES_LECTURA las lecturas hechas dentro de `usar_lectura()`."""
+
+    def db_for_read(self, model, **hints):
+        alias = _alias_lectura.get()
+        if alias is None or _usar_primaria.get():
+            return None
+        # Dentro de una transacción se lee de la principal para ver lo ya escrito
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todos los alias contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASES_LECTURA
@@ -12,7 +12,6 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
-import dj_database_url  # Añadir esta importación
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,11 +28,15 @@ DEBUG = os.environ.get('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '.onrender.com']
 
+# El admin no está en el camino de las peticiones de la API: por defecto solo se carga en
+# desarrollo para no pagar su importación en cada arranque en frío de producción
+ADMIN_HABILITADO = os.environ.get('ADMIN_HABILITADO', str(DEBUG)) == 'True'
+
 
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    *(['django.contrib.admin'] if ADMIN_HABILITADO else []),
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -48,6 +51,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'compactlifes.middleware.CompresionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -56,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'compactlifes.middleware.PrimariaTrasEscrituraMiddleware',
 ]
 
 ROOT_URLCONF = 'compactlifes.urls'
@@ -82,22 +87,85 @@ WSGI_APPLICATION = 'compactlifes.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Ajustes de SQLite para varios workers de gunicorn: WAL permite leer mientras otro
+# proceso escribe y busy_timeout espera al bloqueo en lugar de fallar en el acto
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # en KiB
+    'temp_store': 'MEMORY',
+}
+
+def sqlite_init_command(pragmas):
+    return ';'.join(f'PRAGMA {nombre}={valor}' for nombre, valor in pragmas.items())
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+            # Las transacciones toman el bloqueo de escritura al empezar, así no se
+            # bloquean entre sí al pasar de lectura a escritura
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
 # Configuración para base de datos en producción
 DATABASE_URL = os.environ.get('DATABASE_URL')
 if DATABASE_URL:
+    import dj_database_url
+
     DATABASES['default'] = dj_database_url.config(
         default=DATABASE_URL,
         conn_max_age=600,
         conn_health_checks=True,
     )
 
+# Conexiones de lectura para los endpoints de catálogo. Las réplicas se indican en
+# DATABASE_REPLICA_URLS separadas por comas (también sirven URLs sqlite:/// para
+# simularlas en local); SQLITE_LECTURA añade una conexión de solo lectura al SQLite principal
+PRAGMAS_LECTURA = {nombre: valor for nombre, valor in SQLITE_PRAGMAS.items() if nombre != 'journal_mode'}
+DATABASES_LECTURA = []
+
+for numero, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    import dj_database_url
+
+    alias = f'replica_{numero}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True)
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['OPTIONS'] = {'init_command': sqlite_init_command(PRAGMAS_LECTURA)}
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASES_LECTURA.append(alias)
+
+if os.environ.get('SQLITE_LECTURA', 'False') == 'True' and not DATABASE_URL:
+    DATABASES['lectura'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'OPTIONS': {'init_command': sqlite_init_command(PRAGMAS_LECTURA)},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASES_LECTURA.append('lectura')
+
+DATABASE_ROUTERS = ['compactlifes.routers.LecturaRouter']
+
+# Tras una escritura, el cliente lee de la base principal durante este tiempo
+# (segundos) para ver sus propios cambios aunque las réplicas vayan con retraso.
+# Se recuerda en CACHES, que debe ser compartida por todas las instancias
+REPLICA_RETRASO_MAXIMO = int(os.environ.get('REPLICA_RETRASO_MAXIMO', '5'))
+
+# Caché compartida entre los workers de gunicorn (las invalidaciones del catálogo
+# deben verse en todos los procesos, por eso no se usa la caché en memoria local)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / 'cache'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -119,11 +187,12 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.auth.UsuarioJWTAuthentication',
     ),
+    # La API navegable solo en desarrollo
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',  
-        'rest_framework.renderers.BrowsableAPIRenderer',  
+        'rest_framework.renderers.JSONRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
     ),
 }
 
@@ -167,6 +236,44 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Los archivos de media generados llevan el hash del contenido en el nombre,
+# por lo que se pueden cachear en el cliente de forma indefinida
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Solo se sirve MEDIA_ROOT/productos/ (las miniaturas generadas); las imágenes subidas
+# esperan al worker fuera de MEDIA_ROOT
+SUBIDAS_ROOT = BASE_DIR / 'subidas'
+
+# Procesado de imágenes de productos
+IMAGENES_TIMEOUT = 10
+IMAGENES_TAMANO_MAXIMO = 10 * 1024 * 1024
+
+# Las respuestas JSON menores de este tamaño (bytes) no compensa comprimirlas
+COMPRESION_TAMANO_MINIMO = 1024
+
+# Segundos que se guardan las respuestas del catálogo; además se invalidan al cambiar
+# la versión del catálogo, este límite solo acota el retraso de las promociones programadas
+CACHE_CATALOGO_TIMEOUT = 300
+
+# Minutos que un carrito retiene las unidades reservadas antes de devolverlas al stock
+RESERVA_STOCK_MINUTOS = 15
+
+# Presupuesto de arranque en frío (ms hasta la primera respuesta) de manage.py startup_profile
+ARRANQUE_PRESUPUESTO_MS = float(os.environ.get('ARRANQUE_PRESUPUESTO_MS', '1500'))
+
+# Claves Idempotency-Key: horas que se guarda la respuesta para repetirla en los reintentos y
+# segundos tras los que una petición en curso que no terminó (proceso caído) deja de bloquear la clave
+IDEMPOTENCIA_HORAS = 24
+IDEMPOTENCIA_BLOQUEO_SEGUNDOS = 60
+
+# Cola de tareas en segundo plano (manage.py run_worker). Con TAREAS_SINCRONAS las
+# tareas se ejecutan al confirmar la transacción, sin necesidad de worker
+TAREAS_SINCRONAS = os.environ.get('TAREAS_SINCRONAS', 'False') == 'True'
+TAREAS_MAX_INTENTOS = 5
+TAREAS_BACKOFF_BASE = 10  # segundos
+TAREAS_TIEMPO_MAXIMO = 15 * 60  # segundos antes de considerar muerta una tarea en curso
+TAREAS_RECUPERAR_CADA = 60  # segundos entre búsquedas de tareas muertas en cada worker
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -191,7 +298,7 @@ CORS_ALLOW_METHODS = [
 
 CORS_ALLOW_HEADERS = [
     "accept", "accept-encoding", "authorization", "content-type",
-    "dnt", "origin", "user-agent", "x-csrftoken", "x-requested-with"
+    "dnt", "origin", "user-agent", "x-csrftoken", "x-requested-with", "idempotency-key"
 ]
 
 CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
@@ -0,0 +1,23 @@
+import posixpath
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+
+# Prefijos de MEDIA_ROOT que son públicos: las variantes de imágenes de productos
+MEDIA_PUBLICA = ('productos/',)
+
+
+@require_safe
+def servir_media(request, path):
+    """
+    Sirve las miniaturas de productos con cabeceras de caché larga (los nombres llevan el hash
+    del contenido). FileResponse deja el envío del archivo al servidor WSGI (sendfile en gunicorn).
+    """
+    nombre = posixpath.normpath(path).lstrip('/')
+    if not nombre.startswith(MEDIA_PUBLICA) or not default_storage.exists(nombre):
+        raise Http404
+    response = FileResponse(default_storage.open(nombre))
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+    return response
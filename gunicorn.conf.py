@@ -0,0 +1,28 @@
+"""
+Configuración de gunicorn (Procfile: gunicorn -c gunicorn.conf.py).
+
+Con preload_app el proceso maestro importa Django y la aplicación una sola vez y los
+workers arrancan ya calientes por fork, en lugar de importarlo todo cada uno.
+"""
+import os
+
+wsgi_app = 'compactlifes.wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+
+def when_ready(server):
+    # Carga también las URLs y las vistas (DRF incluido) en el maestro; si no, cada worker
+    # las importaría al atender su primera petición
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def post_fork(server, worker):
+    # Ninguna conexión abierta en el maestro debe compartirse con los workers
+    from django.db import connections
+
+    connections.close_all()